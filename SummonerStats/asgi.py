@@ -0,0 +1,18 @@
+"""
+ASGI config for SummonerStats project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The views are async, so under ASGI every request of a worker shares its event
+loop and its connection pool to Riot's API.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SummonerStats.settings')
+
+application = get_asgi_application()
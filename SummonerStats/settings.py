@@ -39,10 +39,10 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "el_pagination",
 ]
 
 MIDDLEWARE = [
+    "api.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -68,23 +68,16 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
-                "django.template.context_processors.request",  # EL-pagination
             ],
         },
     },
 ]
 
-# El-pagination settings
-EL_PAGINATION_PER_PAGE = 10  # How many objects are normally displayed in a page
-# If you use the default show_more template, here you can customize the content of the loader hidden element. HTML is safe here.
-EL_PAGINATION_LOADING = """<div class="d-flex justify-content-center">
-                                <div class="spinner-border" role="status">
-                                    <span class="visually-hidden">Loading...</span>
-                                </div>
-                            </div>
-                           <br>"""
+MATCHES_PER_PAGE = 10  # Match cards in each page of the matches feed
+TOP_CHAMPIONS = 10  # Champions in the profile's stats
 
 WSGI_APPLICATION = "SummonerStats.wsgi.application"
+ASGI_APPLICATION = "SummonerStats.asgi.application"
 
 
 # Database
@@ -97,6 +90,58 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Rendered match cards and stats sidebars are cached in the "template_fragments" cache, data
+# computed from Riot's responses in the "riot" cache. The backend of each is locmem (per process),
+# file (directory in its _LOCATION) or redis (url in its _LOCATION, shared by every worker).
+# The file backend lists its directory on every set to cull it, prefer redis to share a cache.
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+
+
+def get_cache(backend, location, entries):
+    """Settings of a cache with one of the CACHE_BACKENDS, evicted over the entries"""
+    cache = {"BACKEND": CACHE_BACKENDS[backend]}
+    if backend == "redis":
+        # Redis evicts by its own maxmemory policy, e.g: maxmemory-policy allkeys-lru
+        cache["LOCATION"] = location
+    else:
+        cache["OPTIONS"] = {"MAX_ENTRIES": entries}
+        if backend == "file":
+            cache["LOCATION"] = location
+    return cache
+
+
+RIOT_CACHE_BACKEND = config("RIOT_CACHE_BACKEND", default="locmem")
+RIOT_CACHE_LOCATION = config("RIOT_CACHE_LOCATION", default=os.path.join(BASE_DIR, "cache", "riot"))
+RIOT_CACHE_ENTRIES = config("RIOT_CACHE_ENTRIES", default=5000, cast=int)  # Evicted over this size
+# Seconds each kind of object is kept
+RIOT_CACHE_TTLS = {
+    "match_summary": config("MATCH_SUMMARY_TTL", default=3600, cast=int),
+}
+
+# Fragments are keyed by match or stats version, a worker's copy is never stale
+FRAGMENT_CACHE_BACKEND = config("FRAGMENT_CACHE_BACKEND", default="locmem")
+FRAGMENT_CACHE_LOCATION = config(
+    "FRAGMENT_CACHE_LOCATION", default=os.path.join(BASE_DIR, "cache", "fragments")
+)
+FRAGMENT_CACHE_ENTRIES = config("FRAGMENT_CACHE_ENTRIES", default=10000, cast=int)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "template_fragments": get_cache(
+        FRAGMENT_CACHE_BACKEND, FRAGMENT_CACHE_LOCATION, FRAGMENT_CACHE_ENTRIES
+    ),
+    "riot": get_cache(RIOT_CACHE_BACKEND, RIOT_CACHE_LOCATION, RIOT_CACHE_ENTRIES),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -136,4 +181,83 @@ USE_TZ = True
 
 
 # Static files (CSS, JavaScript, Images)
-STATIC_URL = 'static/'
\ No newline at end of file
+STATIC_URL = 'static/'
+
+
+# Riot API client
+# Base url of the Riot hosts, {routing} is the platform or region, e.g: euw1 or europe.
+# The riot_mock command serves recorded responses at http://127.0.0.1:8001/{routing}
+RIOT_API_URL = config("RIOT_API_URL", default="https://{routing}.api.riotgames.com")
+# Connections are kept alive and shared by every request to the Riot hosts
+RIOT_POOL_LIMIT = config("RIOT_POOL_LIMIT", default=100, cast=int)  # Connections in total
+RIOT_POOL_LIMIT_PER_HOST = config("RIOT_POOL_LIMIT_PER_HOST", default=20, cast=int)
+RIOT_DNS_CACHE_TTL = config("RIOT_DNS_CACHE_TTL", default=300, cast=int)  # Seconds
+RIOT_KEEPALIVE_TIMEOUT = config("RIOT_KEEPALIVE_TIMEOUT", default=60, cast=int)  # Seconds
+RIOT_TIMEOUT = config("RIOT_TIMEOUT", default=10, cast=int)  # Seconds
+# Calls are scheduled to stay under Riot's limits, shared by every worker through this file
+RIOT_RATE_LIMIT_DB = config("RIOT_RATE_LIMIT_DB", default=os.path.join(BASE_DIR, "ratelimit.sqlite3"))
+# Application limit used until the first response's headers, default is a development key
+RIOT_APP_RATE_LIMIT = config("RIOT_APP_RATE_LIMIT", default="20:1,100:120")
+# Calls are tried again on 429, 5xx and network errors, after a random backoff of up
+# to RIOT_BACKOFF_BASE * 2^attempt seconds, until RIOT_MAX_ATTEMPTS or their deadline
+RIOT_MAX_ATTEMPTS = config("RIOT_MAX_ATTEMPTS", default=4, cast=int)
+RIOT_BACKOFF_BASE = config("RIOT_BACKOFF_BASE", default=0.5, cast=float)  # Seconds
+RIOT_BACKOFF_MAX = config("RIOT_BACKOFF_MAX", default=8, cast=float)  # Seconds
+RIOT_DEADLINE = config("RIOT_DEADLINE", default=300, cast=float)  # Seconds of a call, rate limit waits included
+RIOT_VIEW_DEADLINE = config("RIOT_VIEW_DEADLINE", default=5, cast=float)  # Seconds of the calls of a page
+# After RIOT_BREAKER_THRESHOLD failures in a row, calls to the host fail at once for a cooldown
+RIOT_BREAKER_THRESHOLD = config("RIOT_BREAKER_THRESHOLD", default=5, cast=int)
+RIOT_BREAKER_COOLDOWN = config("RIOT_BREAKER_COOLDOWN", default=30, cast=float)  # Seconds
+
+# Runes, summoner spells and queues, downloaded again on a new patch
+CDRAGON_URL = config(
+    "CDRAGON_URL",
+    default="https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/",
+)
+STATIC_DATA_FILE = config("STATIC_DATA_FILE", default=os.path.join(BASE_DIR, "static_data.json"))
+
+# League entries of summoners cached by each process, for the ranks of match players
+LEAGUE_CACHE_TTL = config("LEAGUE_CACHE_TTL", default=600, cast=int)  # Seconds entries are fresh
+LEAGUE_CACHE_STALE = config("LEAGUE_CACHE_STALE", default=3600, cast=int)  # Seconds served while refreshed
+LEAGUE_CACHE_SIZE = config("LEAGUE_CACHE_SIZE", default=20000, cast=int)  # Summoners kept
+
+# Background sync of summoners, run by the run_worker command
+SYNC_INTERVAL = config("SYNC_INTERVAL", default=120, cast=int)  # Seconds before a profile is synced again
+SYNC_JOB_TIMEOUT = config("SYNC_JOB_TIMEOUT", default=600, cast=int)  # Seconds before a running job is retried
+WORKER_POLL_INTERVAL = config("WORKER_POLL_INTERVAL", default=1, cast=float)  # Seconds
+SYNC_MAX_ATTEMPTS = config("SYNC_MAX_ATTEMPTS", default=5, cast=int)  # Tries of a job while Riot is unavailable
+HYDRATE_BATCH = config("HYDRATE_BATCH", default=100, cast=int)  # Matches hydrated per round of a sync
+MATCH_FETCH_CONCURRENCY = config("MATCH_FETCH_CONCURRENCY", default=10, cast=int)  # Match requests at a time
+MATCH_FLUSH_SIZE = config("MATCH_FLUSH_SIZE", default=10, cast=int)  # Matches saved per batch
+
+# Concurrent fetches of the same summoner, match or league run once per process. With
+# "file" (a flock in SINGLE_FLIGHT_DIR) or "db" (a FlightLock row), once across processes too
+SINGLE_FLIGHT_LOCK = config("SINGLE_FLIGHT_LOCK", default="")
+SINGLE_FLIGHT_DIR = config("SINGLE_FLIGHT_DIR", default=os.path.join(BASE_DIR, "cache", "locks"))
+SINGLE_FLIGHT_TIMEOUT = config("SINGLE_FLIGHT_TIMEOUT", default=60, cast=int)  # Seconds before a db lock is taken over
+SINGLE_FLIGHT_POLL = config("SINGLE_FLIGHT_POLL", default=0.1, cast=float)  # Seconds between lock attempts
+
+# Riot calls, cache lookups and ingested matches of every process, served at /metrics
+METRICS_DB = config("METRICS_DB", default=os.path.join(BASE_DIR, "metrics.sqlite3"))
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=5, cast=float)  # Seconds between writes
+
+# Server-Timing header and logs of every request, see api/middleware.py
+SLOW_REQUEST_MS = config("SLOW_REQUEST_MS", default=1000, cast=int)  # Logged as warnings and profiled
+REQUEST_PROFILER = config("REQUEST_PROFILER", default="")  # "cprofile" or "stack", disabled by default
+REQUEST_PROFILE_RATE = config("REQUEST_PROFILE_RATE", default=0.01, cast=float)  # Ratio of requests profiled
+REQUEST_PROFILE_INTERVAL = config("REQUEST_PROFILE_INTERVAL", default=0.005, cast=float)  # Seconds between stacks
+REQUEST_PROFILE_DIR = config("REQUEST_PROFILE_DIR", default=os.path.join(BASE_DIR, "cache", "profiles"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        # INFO logs every request, WARNING only the slow ones
+        "api.timing": {
+            "handlers": ["console"],
+            "level": config("TIMING_LOG_LEVEL", default="WARNING"),
+            "propagate": False,
+        },
+    },
+}
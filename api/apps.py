@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class ApiConfig(AppConfig):
+    name = "api"
+
+    def ready(self):
+        from api.utils import timing
+
+        # Queries of every connection are timed for the Server-Timing header
+        connection_created.connect(timing.add_execute_wrapper)
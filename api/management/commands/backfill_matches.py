@@ -0,0 +1,76 @@
+"""
+Pull a summoner's match history beyond the last 100 matches, in bounded chunks.
+
+    python manage.py backfill_matches EUW1 "summoner name" --pages 5
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Summoner
+from api.utils import aggregates, databases, interactions, sync
+
+
+class Command(BaseCommand):
+    help = "Add older matches of a summoner and compute their player summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("server", help="Platform, e.g: EUW1")
+        parser.add_argument("summoner_name")
+        parser.add_argument(
+            "--pages", type=int, default=1, help="Matchlist pages to request"
+        )
+        parser.add_argument(
+            "--count", type=int, default=100, help="Match ids per page, up to 100"
+        )
+        parser.add_argument(
+            "--chunk", type=int, default=100, help="Matches hydrated per round"
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.backfill(options))
+
+    async def backfill(self, options):
+        summoner_name = options["summoner_name"]
+        summoners = Summoner.objects.filter(
+            server=options["server"], summoner=summoner_name
+        )
+
+        summoner_db = await summoners.afirst()
+        if summoner_db is None or not summoner_db.puuid:
+            summoner = await interactions.get_summoner(options["server"], summoner_name)
+            if not summoner["success"]:
+                raise CommandError("Summoner not found: " + summoner_name)
+
+            if summoner_db is None:
+                await sync_to_async(databases.create_user_db)(
+                    options["server"], summoner_name, summoner["puuid"]
+                )
+                summoner_db = await summoners.aget()
+            else:
+                summoner_db.puuid = summoner["puuid"]
+                await summoner_db.asave(update_fields=["puuid"])
+
+        added = await sync.backfill_matchlist(
+            options["server"], summoner_db, options["pages"], options["count"]
+        )
+        self.stdout.write("Added " + str(added) + " match ids")
+
+        total = 0
+        hydrated = await sync.hydrate_matches(summoner_db, options["chunk"])
+        while hydrated:
+            total += hydrated
+            self.stdout.write("Hydrated " + str(total) + " matches")
+            hydrated = await sync.hydrate_matches(summoner_db, options["chunk"])
+
+        await sync.update_cursor(summoner_db)
+        await sync_to_async(aggregates.rebuild_summoner)(summoner_db)
+
+        if summoner_db.backfill_done:
+            self.stdout.write(self.style.SUCCESS("Match history complete"))
+        else:
+            self.stdout.write(
+                "History continues at match " + str(summoner_db.backfill_start)
+            )
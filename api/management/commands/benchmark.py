@@ -0,0 +1,336 @@
+"""
+Benchmark the profile, matches feed, stats refresh and match detail views.
+
+A synthetic summoner of each history size is synced from the local Riot
+stand-in (api/utils/riot_mock.py) into a throwaway database, then every view is
+requested through the ASGI stack, cold (caches cleared before each request)
+and warm, at each concurrency level.
+
+    python manage.py benchmark
+    python manage.py benchmark --history 20 300 --concurrency 1 8 32 --requests 200
+    python manage.py benchmark --compare benchmark-1a2b3c4.json
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from aiohttp import web
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import override_settings
+
+from api.models import Summoner
+from api.utils import (
+    aggregates,
+    databases,
+    jobs,
+    leagues,
+    metrics,
+    riot,
+    riot_mock,
+    sync,
+)
+
+ENDPOINTS = ["profile", "matches", "refresh", "match"]
+SERVER = "EUW1"
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_commit():
+    """Short hash of the checked out commit, empty outside a git repository"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def clear_caches():
+    """Empty every Django cache and the process cache of league entries"""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    leagues._entries.clear()
+
+
+class Command(BaseCommand):
+    help = "Measure the latency, throughput, queries and Riot calls of the views"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--history",
+            type=int,
+            nargs="+",
+            default=[20, 100],
+            help="Matches of the synthetic summoners",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 8],
+            help="Requests in flight at a time",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=50, help="Requests measured per run"
+        )
+        parser.add_argument(
+            "--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.02, help="Seconds of each Riot response"
+        )
+        parser.add_argument(
+            "--app-limit",
+            default="100000:1",
+            help="Rate limit of the stand-in, Riot's development key is 20:1,100:120",
+        )
+        parser.add_argument("--port", type=int, default=8002, help="Port of the stand-in")
+        parser.add_argument(
+            "--output", help="Results file, benchmark-COMMIT.json by default"
+        )
+        parser.add_argument("--compare", help="Results file of a previous run")
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix="benchmark-")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(
+                RIOT_API_URL="http://127.0.0.1:" + str(options["port"]) + "/{routing}",
+                CDRAGON_URL="http://127.0.0.1:" + str(options["port"]) + "/cdragon/",
+                RIOT_APP_RATE_LIMIT=options["app_limit"],
+                RIOT_RATE_LIMIT_DB=os.path.join(workdir, "ratelimit.sqlite3"),
+                METRICS_DB=os.path.join(workdir, "metrics.sqlite3"),
+                STATIC_DATA_FILE=os.path.join(workdir, "static_data.json"),
+                SINGLE_FLIGHT_DIR=os.path.join(workdir, "locks"),
+                ALLOWED_HOSTS=["testserver"],
+                CACHES={
+                    **settings.CACHES,
+                    "template_fragments": {
+                        **settings.CACHES["template_fragments"],
+                        "LOCATION": os.path.join(workdir, "fragments"),
+                    },
+                    "riot": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                        "LOCATION": "benchmark-riot",
+                    },
+                },
+            ):
+                try:
+                    results = asyncio.run(self.run(options, workdir))
+                finally:
+                    # Not in the metrics of the real processes
+                    metrics.flush()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        commit = get_commit()
+        output = options["output"] or "benchmark-" + (commit or "local") + ".json"
+        with open(output, "w") as file:
+            json.dump(
+                {
+                    "commit": commit,
+                    "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "options": {
+                        name: options[name]
+                        for name in ["history", "concurrency", "requests", "latency", "app_limit"]
+                    },
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+        self.stdout.write(self.style.SUCCESS("Saved " + output))
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    async def run(self, options, workdir):
+        app = riot_mock.get_app(
+            os.path.join(workdir, "fixtures"),
+            latency=options["latency"],
+            app_limit=options["app_limit"],
+        )
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", options["port"]).start()
+
+        # Sync views and ORM calls run in a single thread, where the queries are counted
+        self.queries = QueryCounter()
+        await sync_to_async(lambda: connection.execute_wrappers.append(self.queries))()
+
+        results = []
+        try:
+            for history in options["history"]:
+                summoner_name = "bench" + str(history)
+                match_ids = riot_mock.generate(
+                    os.path.join(workdir, "fixtures"), SERVER, summoner_name, history
+                )
+                started = time.perf_counter()
+                await self.sync(summoner_name)
+                self.stdout.write(
+                    "Synced "
+                    + str(history)
+                    + " matches in "
+                    + str(round(time.perf_counter() - started, 2))
+                    + "s"
+                )
+
+                urls = await self.get_urls(summoner_name, match_ids)
+                for endpoint in options["endpoints"]:
+                    for scenario in ["cold", "warm"]:
+                        for concurrency in options["concurrency"]:
+                            result = await self.measure(
+                                app, urls[endpoint], options["requests"], concurrency, scenario
+                            )
+                            result.update(
+                                history=history,
+                                endpoint=endpoint,
+                                scenario=scenario,
+                                concurrency=concurrency,
+                            )
+                            results.append(result)
+                            self.report(result)
+        finally:
+            await riot.get_session().close()
+            await runner.cleanup()
+
+        return results
+
+    async def sync(self, summoner_name):
+        """Sync the summoner as the worker does, then its older matches as backfill_matches does"""
+
+        job = await jobs.enqueue_sync(SERVER, summoner_name, None)
+        await sync.sync_summoner(job)
+
+        summoner_db = await Summoner.objects.aget(
+            server=SERVER, summoner=summoner_name
+        )
+        while not summoner_db.backfill_done:
+            await sync.backfill_matchlist(SERVER, summoner_db)
+        while await sync.hydrate_matches(summoner_db, settings.HYDRATE_BATCH):
+            pass
+        await sync.update_cursor(summoner_db)
+        await sync_to_async(aggregates.rebuild_summoner)(summoner_db)
+
+    async def get_urls(self, summoner_name, match_ids):
+        """Urls requested for each endpoint, the matches feed starts at its second page"""
+
+        summoner_db = await Summoner.objects.aget(
+            server=SERVER, summoner=summoner_name
+        )
+        _, cursor = await sync_to_async(databases.get_feed_page)(
+            summoner_db.puuid, size=settings.MATCHES_PER_PAGE
+        )
+        profile = "/" + SERVER + "/" + summoner_name + "/"
+        return {
+            "profile": [profile],
+            "matches": [profile + "matches" + ("?before=" + cursor if cursor else "")],
+            "refresh": [profile + "refresh"],
+            "match": [profile + match_id + "/" for match_id in match_ids],
+        }
+
+    async def measure(self, app, urls, requests, concurrency, scenario):
+        """Latency percentiles, throughput, queries and Riot calls of the requests"""
+
+        client = AsyncClient()
+        if scenario == "warm":
+            for url in urls[:requests]:
+                await client.get(url)
+
+        targets = iter([urls[i % len(urls)] for i in range(requests)])
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for url in targets:
+                if scenario == "cold":
+                    await sync_to_async(clear_caches)()
+                started = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        queries = self.queries.count
+        calls = app["calls"]
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+        latencies = np.array(latencies) * 1000
+        return {
+            "requests": requests,
+            "errors": errors,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "mean_ms": round(float(latencies.mean()), 2),
+            "requests_per_second": round(requests / elapsed, 1),
+            "queries_per_request": round((self.queries.count - queries) / requests, 2),
+            "riot_calls_per_request": round((app["calls"] - calls) / requests, 2),
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            "{history:>5} {endpoint:<8} {scenario:<5} c={concurrency:<3} "
+            "p50={p50_ms}ms p95={p95_ms}ms p99={p99_ms}ms {requests_per_second} req/s "
+            "{queries_per_request} queries {riot_calls_per_request} riot calls "
+            "{errors} errors".format(**result)
+        )
+
+    def compare(self, path, results):
+        """p95 and throughput of each run against the same run of a previous file"""
+
+        with open(path) as file:
+            previous = json.load(file)
+
+        def key(result):
+            return (
+                result["history"],
+                result["endpoint"],
+                result["scenario"],
+                result["concurrency"],
+            )
+
+        before = {key(result): result for result in previous["results"]}
+        self.stdout.write("Compared with " + (previous.get("commit") or path))
+        for result in results:
+            old = before.get(key(result))
+            if old is None:
+                continue
+            self.stdout.write(
+                "{:>5} {:<8} {:<5} c={:<3} p95 {} -> {}ms, {} -> {} req/s".format(
+                    *key(result),
+                    old["p95_ms"],
+                    result["p95_ms"],
+                    old["requests_per_second"],
+                    result["requests_per_second"],
+                )
+            )
@@ -0,0 +1,52 @@
+"""
+Add the stored matches that aren't counted yet to the champion rollups and stat buckets.
+
+    python manage.py rebuild_rollups
+    python manage.py rebuild_rollups --reset --batch 500
+"""
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from api.models import Match
+from api.utils import rollups, static_data
+
+
+class Command(BaseCommand):
+    help = "Add hydrated matches to the champion rollups and stat buckets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Empty the rollups and count every match again",
+        )
+        parser.add_argument(
+            "--batch", type=int, default=500, help="Matches added per transaction"
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            rollups.reset()
+
+        # Matches that can't be summarized stay in the query, batches go by match id
+        matches = (
+            Match.objects.filter(hydrated=True, rolled_up=False)
+            .order_by("match_id")
+            .values_list("match_id", "patch")
+        )
+
+        total = 0
+        batch = list(matches[: options["batch"]])
+        while batch:
+            match_ids = [match_id for match_id, patch in batch]
+            # Runes and spells of the newest patch, for the missing participants
+            patches = [patch for match_id, patch in batch if patch]
+            async_to_sync(static_data.load)(
+                max(patches, key=static_data.get_version_tuple, default=None)
+            )
+            total += rollups.add_matches(rollups.add_missing_participants(match_ids))
+            self.stdout.write("Added " + str(total) + " matches")
+            batch = list(matches.filter(match_id__gt=match_ids[-1])[: options["batch"]])
+
+        self.stdout.write(self.style.SUCCESS("Added " + str(total) + " matches"))
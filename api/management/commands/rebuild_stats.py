@@ -0,0 +1,42 @@
+"""
+Compute the stats of the summoners again from their stored participants.
+
+    python manage.py rebuild_stats
+    python manage.py rebuild_stats "summoner name" --batch 50
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.models import Summoner
+from api.utils import aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the role, champion and overall stats of summoners"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "summoner_names", nargs="*", help="Summoners to rebuild, all by default"
+        )
+        parser.add_argument(
+            "--batch", type=int, default=100, help="Summoners rebuilt per query"
+        )
+
+    def handle(self, *args, **options):
+        summoners = Summoner.objects.exclude(puuid="").order_by("pk")
+        if options["summoner_names"]:
+            summoners = summoners.filter(summoner__in=options["summoner_names"])
+
+        batch = []
+        total = 0
+        for summoner_db in summoners.iterator(chunk_size=options["batch"]):
+            batch.append(summoner_db)
+            if len(batch) == options["batch"]:
+                total += len(aggregates.rebuild_summoners(batch))
+                self.stdout.write("Rebuilt " + str(total) + " summoners")
+                batch = []
+
+        if batch:
+            total += len(aggregates.rebuild_summoners(batch))
+
+        self.stdout.write(self.style.SUCCESS("Rebuilt " + str(total) + " summoners"))
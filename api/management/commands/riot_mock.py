@@ -0,0 +1,79 @@
+"""
+Serve recorded responses of RIOT's API locally, see api/utils/riot_mock.py.
+
+    python manage.py riot_mock --record
+    python manage.py riot_mock --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+
+import os
+
+from aiohttp import web
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.utils import riot_mock
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in of Riot's API that replays recorded responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument(
+            "--fixtures",
+            default=os.path.join(settings.BASE_DIR, "riot_fixtures"),
+            help="Folder of the recorded responses",
+        )
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Fetch the missing responses from Riot with the API key and save them",
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0, help="Seconds every response waits"
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=0, help="Random extra seconds, up to this value"
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Ratio of calls under the limits answered with a 429 anyway",
+        )
+        parser.add_argument(
+            "--retry-after", type=int, default=1, help="Retry-After seconds of those 429"
+        )
+        parser.add_argument(
+            "--app-limit",
+            default=settings.RIOT_APP_RATE_LIMIT,
+            help="Application limit of each routing value, e.g: 20:1,100:120",
+        )
+        parser.add_argument(
+            "--method-limit", default="2000:10", help="Limit of each endpoint"
+        )
+
+    def handle(self, *args, **options):
+        app = riot_mock.get_app(
+            options["fixtures"],
+            record=options["record"],
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            retry_after=options["retry_after"],
+            app_limit=options["app_limit"],
+            method_limit=options["method_limit"],
+        )
+        self.stdout.write(
+            "Point RIOT_API_URL at http://"
+            + options["host"]
+            + ":"
+            + str(options["port"])
+            + "/{routing} and CDRAGON_URL at http://"
+            + options["host"]
+            + ":"
+            + str(options["port"])
+            + "/cdragon/"
+        )
+        web.run_app(app, host=options["host"], port=options["port"], print=None)
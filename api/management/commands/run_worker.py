@@ -0,0 +1,53 @@
+"""
+Run the summoner syncs queued by the profile page, so the page never waits on Riot.
+
+    python manage.py run_worker
+"""
+
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.utils import jobs, metrics, riot, sync
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Sync queued summoners with Riot's API in background"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when the queue is empty"
+        )
+
+    def handle(self, *args, **options):
+        # A single event loop, so every sync shares the same connection pool
+        asyncio.run(self.work(options["once"]))
+
+    async def work(self, once):
+        while True:
+            job = await jobs.claim_job()
+
+            if job is None:
+                # Increments waiting for the next flush are served while idle too
+                metrics.flush()
+                if once:
+                    return
+                await asyncio.sleep(settings.WORKER_POLL_INTERVAL)
+                continue
+
+            self.stdout.write("Syncing " + job.server + "/" + job.summoner_name)
+            try:
+                await sync.sync_summoner(job)
+            except riot.RiotUnavailable as error:
+                # Synced again once Riot recovers, the profile shows what is saved
+                logger.warning(
+                    "Sync of %s/%s postponed: %s", job.server, job.summoner_name, error
+                )
+                await jobs.requeue_job(job, str(error))
+            except Exception as error:
+                logger.exception("Sync of %s/%s failed", job.server, job.summoner_name)
+                await jobs.finish_job(job, str(error) or error.__class__.__name__)
@@ -0,0 +1,183 @@
+"""
+Server-Timing header, logs and sampled profiles of every request.
+
+The phases timed by api/utils/timing.py (Riot calls, rate limit waits, queries
+and rendering) are sent in the Server-Timing header, shown by the browser's
+network tab, and logged as a line of JSON by the "api.timing" logger, at
+WARNING for requests slower than SLOW_REQUEST_MS.
+
+A ratio of requests, REQUEST_PROFILE_RATE, is profiled with REQUEST_PROFILER
+and the profile is kept in REQUEST_PROFILE_DIR if the request was slow:
+    "cprofile"  cProfile of the event loop's thread, read with python -m pstats
+    "stack"     Stacks of every thread sampled every REQUEST_PROFILE_INTERVAL,
+                in the collapsed format of flamegraph.pl and speedscope.app
+Either profiles whatever else the process runs meanwhile, one request is
+profiled at a time.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from api.utils import timing
+
+logger = logging.getLogger("api.timing")
+
+_profiling = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of the other threads until stopped"""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        code.co_name
+                        + " ("
+                        + os.path.basename(code.co_filename)
+                        + ":"
+                        + str(frame.f_lineno)
+                        + ")"
+                    )
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.join()
+
+    def dump_stats(self, path):
+        with open(path, "w") as file:
+            for stack, count in self.stacks.items():
+                file.write(stack + " " + str(count) + "\n")
+
+
+def start_profile():
+    """Profiler of the request, None if it isn't sampled or another one runs"""
+
+    if (
+        settings.REQUEST_PROFILER not in ("cprofile", "stack")
+        or random.random() >= settings.REQUEST_PROFILE_RATE
+        or not _profiling.acquire(blocking=False)
+    ):
+        return None
+
+    if settings.REQUEST_PROFILER == "cprofile":
+        profile = cProfile.Profile()
+    else:
+        profile = StackSampler(settings.REQUEST_PROFILE_INTERVAL)
+    profile.enable()
+    return profile
+
+
+def stop_profile(profile, request, slow):
+    """Stop the profiler and save its profile if the request was slow
+
+    Returns:
+        Path of the profile, None if it wasn't saved
+    """
+
+    profile.disable()
+    _profiling.release()
+    if not slow:
+        return None
+
+    os.makedirs(settings.REQUEST_PROFILE_DIR, exist_ok=True)
+    name = (
+        time.strftime("%Y%m%d-%H%M%S")
+        + "-"
+        + str(time.time_ns() // 1000000 % 1000)
+        + request.path.replace("/", "_")
+    )
+    path = os.path.join(
+        settings.REQUEST_PROFILE_DIR,
+        name[:150] + (".prof" if isinstance(profile, cProfile.Profile) else ".txt"),
+    )
+    profile.dump_stats(path)
+    return path
+
+
+class ServerTimingMiddleware:
+    """Times the phases of each request, see the module's docstring"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings, token, profile, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self.finish(request, response, timings, profile, started)
+
+    async def __acall__(self, request):
+        timings, token, profile, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self.finish(request, response, timings, profile, started)
+
+    def start(self):
+        timings, token = timing.start()
+        profile = start_profile()
+        return timings, token, profile, time.perf_counter()
+
+    def finish(self, request, response, timings, profile, started):
+        total = time.perf_counter() - started
+        slow = total * 1000 >= settings.SLOW_REQUEST_MS
+        profile_path = None
+        if profile is not None:
+            profile_path = stop_profile(profile, request, slow)
+
+        response["Server-Timing"] = timing.get_header(timings, total)
+
+        level = logging.WARNING if slow else logging.INFO
+        if logger.isEnabledFor(level):
+            record = {
+                "method": request.method,
+                "path": request.get_full_path(),
+                "status": response.status_code,
+                "ms": round(total * 1000, 1),
+            }
+            for name, (seconds, count) in timings.items():
+                record[name + "_ms"] = round(seconds * 1000, 1)
+                record[name + "_calls"] = count
+            if profile_path:
+                record["profile"] = profile_path
+            logger.log(level, json.dumps(record))
+
+        return response
@@ -0,0 +1,111 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_matches(apps, schema_editor):
+    """Store each match json once and move the player summaries to participants"""
+    LegacyMatch = apps.get_model("api", "LegacyMatch")
+    Match = apps.get_model("api", "Match")
+    Participant = apps.get_model("api", "Participant")
+
+    matches = {}
+    participants = {}
+    for legacy_match in LegacyMatch.objects.exclude(match_json={}).iterator():
+        match_json = legacy_match.match_json
+        if legacy_match.match_id not in matches:
+            info = match_json["info"]
+            matches[legacy_match.match_id] = Match(
+                match_id=legacy_match.match_id,
+                queue_id=info["queueId"],
+                game_mode=info["gameMode"],
+                game_creation=info["gameCreation"],
+                game_duration=info["gameDuration"],
+                patch=match_json.get("patch", ""),
+                match_json=match_json,
+            )
+
+        # Matches without summary are fetched again from the summoner's matchlist
+        summary = legacy_match.summoner_json
+        if summary and (legacy_match.match_id, summary["puuid"]) not in participants:
+            participants[(legacy_match.match_id, summary["puuid"])] = Participant(
+                match_id=legacy_match.match_id,
+                puuid=summary["puuid"],
+                summoner_name=summary["summonerName"],
+                champion_id=summary["championId"],
+                champion_name=summary["championName"],
+                team_position=summary["teamPosition"],
+                kills=summary["kills"],
+                deaths=summary["deaths"],
+                assists=summary["assists"],
+                minions=summary["totalMinionsKilled"] + summary["neutralMinionsKilled"],
+                vision=summary["visionScore"],
+                gold=summary["goldEarned"],
+                damage=summary["totalDamageDealtToChampions"],
+                win=summary["win"],
+                summary=summary,
+            )
+
+    Match.objects.bulk_create(matches.values(), batch_size=500)
+    Participant.objects.bulk_create(participants.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='Match',
+            new_name='LegacyMatch',
+        ),
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('match_id', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('queue_id', models.IntegerField(null=True)),
+                ('game_mode', models.CharField(blank=True, max_length=30)),
+                ('game_creation', models.BigIntegerField(null=True)),
+                ('game_duration', models.IntegerField(null=True)),
+                ('patch', models.CharField(blank=True, max_length=10)),
+                ('match_json', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['-match_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Participant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puuid', models.CharField(max_length=78)),
+                ('summoner_name', models.CharField(blank=True, max_length=50)),
+                ('champion_id', models.IntegerField(null=True)),
+                ('champion_name', models.CharField(blank=True, max_length=30)),
+                ('team_position', models.CharField(blank=True, max_length=10)),
+                ('kills', models.IntegerField(default=0)),
+                ('deaths', models.IntegerField(default=0)),
+                ('assists', models.IntegerField(default=0)),
+                ('minions', models.IntegerField(default=0)),
+                ('vision', models.IntegerField(default=0)),
+                ('gold', models.IntegerField(default=0)),
+                ('damage', models.IntegerField(default=0)),
+                ('win', models.BooleanField(default=False)),
+                ('summary', models.JSONField(default=dict)),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='api.match')),
+            ],
+            options={
+                'ordering': ['-match_id'],
+                'indexes': [models.Index(fields=['puuid', '-match'], name='participant_puuid_match'), models.Index(fields=['champion_id', 'team_position'], name='participant_champion_role')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='participant',
+            constraint=models.UniqueConstraint(fields=('match', 'puuid'), name='unique_match_participant'),
+        ),
+        migrations.RunPython(split_matches, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='LegacyMatch',
+        ),
+    ]
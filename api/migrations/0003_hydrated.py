@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+def mark_hydrated(apps, schema_editor):
+    """Rows stored before the flag existed are hydrated if their json isn't empty"""
+    Match = apps.get_model("api", "Match")
+    Participant = apps.get_model("api", "Participant")
+    Match.objects.exclude(match_json={}).update(hydrated=True)
+    Participant.objects.exclude(summary={}).update(hydrated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_match_participant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='hydrated',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='hydrated',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(mark_hydrated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_hydrated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='backfill_done',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='backfill_start',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='last_game_creation',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='puuid',
+            field=models.CharField(blank=True, db_index=True, max_length=78),
+        ),
+    ]
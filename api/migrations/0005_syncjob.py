@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_summoner_sync_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='league_json',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='server',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='summoner_json',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='synced_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('server', models.CharField(max_length=5)),
+                ('summoner_name', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('matches_total', models.IntegerField(default=0)),
+                ('matches_done', models.IntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['created'],
+                'indexes': [models.Index(fields=['status', 'created'], name='syncjob_status_created'), models.Index(fields=['summoner_name', 'server', '-created'], name='syncjob_summoner_created')],
+            },
+        ),
+    ]
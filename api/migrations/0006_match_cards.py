@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:17
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Copies of the card builders of api.utils.databases when the cards were added,
+# so later changes to them don't change what this migration does
+
+# Keys of the player summary shown in the match card
+CARD_FIELDS = [
+    "win",
+    "teamPosition",
+    "championId",
+    "summoner_spell_1",
+    "summoner_spell_2",
+    "rune_primary",
+    "rune_secondary",
+    "kills",
+    "deaths",
+    "assists",
+    "kda",
+    "items",
+    "cs",
+    "cs_per_min",
+    "gold_short",
+    "damage_short",
+]
+
+
+def get_match_card(match_json):
+    """Fields of the match shown in the match card"""
+    return {
+        "match_mode": match_json.get("match_mode", ""),
+        "game_mode": match_json["info"]["gameMode"],
+        "date": match_json.get("date", ""),
+        "patch": match_json.get("patch", ""),
+        "matchups": [
+            [
+                {
+                    "championId": participant["championId"],
+                    "summonerName": participant["summonerName"],
+                }
+                for participant in matchup
+            ]
+            for matchup in match_json["info"].get("matchups", [])
+        ],
+    }
+
+
+def get_participant_card(player_summary):
+    """Fields of the player summary shown in the match card"""
+    card = {field: player_summary.get(field) for field in CARD_FIELDS}
+    card["kill_participation"] = player_summary.get("challenges", {}).get(
+        "kill_participation_percentage", "ERROR"
+    )
+    return card
+
+
+def fill_cards(apps, schema_editor):
+    """Cards and feed cursor of the rows hydrated before the fields existed"""
+    Match = apps.get_model("api", "Match")
+    Participant = apps.get_model("api", "Participant")
+
+    Participant.objects.update(
+        game_creation=Subquery(
+            Match.objects.filter(pk=OuterRef("match_id")).values("game_creation")[:1]
+        )
+    )
+
+    matches = []
+    for match in Match.objects.filter(hydrated=True).iterator():
+        match.card = get_match_card(match.match_json)
+        matches.append(match)
+    Match.objects.bulk_update(matches, ["card"], batch_size=500)
+
+    participants = []
+    for participant in Participant.objects.filter(hydrated=True).iterator():
+        participant.card = get_participant_card(participant.summary)
+        participants.append(participant)
+    Participant.objects.bulk_update(participants, ["card"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_syncjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='card',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='card',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='game_creation',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['puuid', '-game_creation', '-match'], name='participant_puuid_created'),
+        ),
+        migrations.RunPython(fill_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_match_cards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='stats_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
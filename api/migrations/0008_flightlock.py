@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_summoner_stats_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightLock',
+            fields=[
+                ('key', models.CharField(max_length=150, primary_key=True, serialize=False)),
+                ('acquired', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_flightlock'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='participant',
+            name='summary',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_remove_participant_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ChampionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patch', models.CharField(max_length=10)),
+                ('queue_id', models.IntegerField()),
+                ('role', models.CharField(max_length=10)),
+                ('champion_id', models.IntegerField()),
+                ('champion_name', models.CharField(blank=True, max_length=30)),
+                ('matches', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('kills', models.BigIntegerField(default=0)),
+                ('deaths', models.BigIntegerField(default=0)),
+                ('assists', models.BigIntegerField(default=0)),
+                ('minions', models.BigIntegerField(default=0)),
+                ('vision', models.BigIntegerField(default=0)),
+                ('gold', models.BigIntegerField(default=0)),
+                ('damage', models.BigIntegerField(default=0)),
+                ('duration', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('patch', 'queue_id', 'role', 'champion_id'), name='unique_champion_rollup')],
+            },
+        ),
+    ]
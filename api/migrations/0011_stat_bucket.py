@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_champion_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puuid', models.CharField(max_length=78)),
+                ('queue_id', models.IntegerField()),
+                ('day', models.IntegerField()),
+                ('patch', models.CharField(max_length=10)),
+                ('champion_name', models.CharField(max_length=30)),
+                ('role', models.CharField(max_length=10)),
+                ('matches', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('minutes', models.IntegerField(default=0)),
+                ('kills', models.IntegerField(default=0)),
+                ('deaths', models.IntegerField(default=0)),
+                ('assists', models.IntegerField(default=0)),
+                ('minions', models.IntegerField(default=0)),
+                ('vision', models.IntegerField(default=0)),
+                ('gold', models.BigIntegerField(default=0)),
+                ('damage', models.BigIntegerField(default=0)),
+                ('last_played', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('puuid', 'queue_id', 'day', 'patch', 'champion_name', 'role'), name='unique_stat_bucket')],
+            },
+        ),
+    ]
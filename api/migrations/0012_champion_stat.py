@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+def reset_totals(apps, schema_editor):
+    """Count every match again with rebuild_rollups, the champion stats start empty"""
+    apps.get_model("api", "ChampionRollup").objects.all().delete()
+    apps.get_model("api", "StatBucket").objects.all().delete()
+    apps.get_model("api", "Match").objects.filter(rolled_up=True).update(rolled_up=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_stat_bucket'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='summoner',
+            name='champions',
+        ),
+        migrations.CreateModel(
+            name='ChampionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puuid', models.CharField(max_length=78)),
+                ('queue_id', models.IntegerField()),
+                ('champion_name', models.CharField(max_length=30)),
+                ('matches', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('minutes', models.IntegerField(default=0)),
+                ('kills', models.IntegerField(default=0)),
+                ('deaths', models.IntegerField(default=0)),
+                ('assists', models.IntegerField(default=0)),
+                ('minions', models.IntegerField(default=0)),
+                ('vision', models.IntegerField(default=0)),
+                ('gold', models.BigIntegerField(default=0)),
+                ('damage', models.BigIntegerField(default=0)),
+                ('last_played', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['puuid', 'queue_id', '-matches', '-wins'], name='championstat_top')],
+                'constraints': [models.UniqueConstraint(fields=('puuid', 'queue_id', 'champion_name'), name='unique_champion_stat')],
+            },
+        ),
+        migrations.RunPython(reset_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_champion_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+def set_servers(apps, schema_editor):
+    """Give rows stored without a server the one of their last sync job
+
+    Then only the last synced row of each server and name is kept.
+    """
+    Summoner = apps.get_model("api", "Summoner")
+    SyncJob = apps.get_model("api", "SyncJob")
+
+    for summoner in Summoner.objects.filter(server=""):
+        server = (
+            SyncJob.objects.filter(summoner_name=summoner.summoner)
+            .order_by("-created")
+            .values_list("server", flat=True)
+            .first()
+        )
+        if server:
+            summoner.server = server
+            summoner.save(update_fields=["server"])
+
+    kept = set()
+    for summoner in Summoner.objects.order_by("-synced_at", "-pk"):
+        key = (summoner.server, summoner.summoner)
+        if key in kept:
+            summoner.delete()
+        kept.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_syncjob_retry'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_servers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='summoner',
+            constraint=models.UniqueConstraint(fields=('server', 'summoner'), name='unique_server_summoner'),
+        ),
+    ]
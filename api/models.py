@@ -3,10 +3,17 @@ from django.db import models
 
 class Match(models.Model):
 
-    match_id = models.CharField(max_length=15)
+    match_id = models.CharField(max_length=20, primary_key=True)
+    queue_id = models.IntegerField(null=True)
+    game_mode = models.CharField(max_length=30, blank=True)
+    game_creation = models.BigIntegerField(null=True)  # Epoch milliseconds
+    game_duration = models.IntegerField(null=True)  # Seconds
+    patch = models.CharField(max_length=10, blank=True)
+    hydrated = models.BooleanField(default=False, db_index=True)  # match_json fetched
+    rolled_up = models.BooleanField(default=False)  # Counted in the champion rollups
+    # Fields of the match card, so the matches feed doesn't load match_json
+    card = models.JSONField(default=dict)
     match_json = models.JSONField(default=dict)
-    summoner = models.CharField(max_length=50)
-    summoner_json = models.JSONField(default=dict)
 
     class Meta:
         ordering = ["-match_id"]
@@ -15,17 +22,234 @@ class Match(models.Model):
         return self.match_id
 
 
+class Participant(models.Model):
+
+    match = models.ForeignKey(
+        Match, on_delete=models.CASCADE, related_name="participants"
+    )
+    puuid = models.CharField(max_length=78)
+    game_creation = models.BigIntegerField(null=True)  # Of the match, to paginate the feed
+    summoner_name = models.CharField(max_length=50, blank=True)
+    champion_id = models.IntegerField(null=True)
+    champion_name = models.CharField(max_length=30, blank=True)
+    team_position = models.CharField(max_length=10, blank=True)
+    kills = models.IntegerField(default=0)
+    deaths = models.IntegerField(default=0)
+    assists = models.IntegerField(default=0)
+    minions = models.IntegerField(default=0)
+    vision = models.IntegerField(default=0)
+    gold = models.IntegerField(default=0)
+    damage = models.IntegerField(default=0)
+    win = models.BooleanField(default=False)
+    hydrated = models.BooleanField(default=False, db_index=True)  # card computed
+    # Fields of the player summary shown in the match card
+    card = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["-match_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["match", "puuid"], name="unique_match_participant"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["puuid", "-match"], name="participant_puuid_match"),
+            models.Index(
+                fields=["puuid", "-game_creation", "-match"],
+                name="participant_puuid_created",
+            ),
+            models.Index(
+                fields=["champion_id", "team_position"],
+                name="participant_champion_role",
+            ),
+        ]
+
+    def __str__(self):
+        return self.match_id + " " + self.puuid
+
+
+class ChampionRollup(models.Model):
+    """Totals of a champion in a role over every stored match of a patch and queue"""
+
+    patch = models.CharField(max_length=10)
+    queue_id = models.IntegerField()
+    role = models.CharField(max_length=10)  # teamPosition, empty in modes without roles
+    champion_id = models.IntegerField()
+    champion_name = models.CharField(max_length=30, blank=True)
+    matches = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    kills = models.BigIntegerField(default=0)
+    deaths = models.BigIntegerField(default=0)
+    assists = models.BigIntegerField(default=0)
+    minions = models.BigIntegerField(default=0)
+    vision = models.BigIntegerField(default=0)
+    gold = models.BigIntegerField(default=0)
+    damage = models.BigIntegerField(default=0)
+    duration = models.BigIntegerField(default=0)  # Seconds
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["patch", "queue_id", "role", "champion_id"],
+                name="unique_champion_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return self.patch + " " + str(self.queue_id) + " " + self.champion_name
+
+
+class StatBucket(models.Model):
+    """Totals of a player's matches of a day, queue, patch, champion and role
+
+    Windowed stats of a summoner are sums of its buckets, see utils/windows.py
+    """
+
+    puuid = models.CharField(max_length=78)
+    queue_id = models.IntegerField()
+    day = models.IntegerField()  # Days since epoch of the match creation
+    patch = models.CharField(max_length=10)
+    champion_name = models.CharField(max_length=30)
+    role = models.CharField(max_length=10)
+    matches = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    minutes = models.IntegerField(default=0)
+    kills = models.IntegerField(default=0)
+    deaths = models.IntegerField(default=0)
+    assists = models.IntegerField(default=0)
+    minions = models.IntegerField(default=0)
+    vision = models.IntegerField(default=0)
+    gold = models.BigIntegerField(default=0)
+    damage = models.BigIntegerField(default=0)
+    last_played = models.BigIntegerField(default=0)  # Epoch milliseconds
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["puuid", "queue_id", "day", "patch", "champion_name", "role"],
+                name="unique_stat_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return self.puuid + " " + str(self.day) + " " + self.champion_name
+
+
+class ChampionStat(models.Model):
+    """Totals of a player's matches with a champion in a queue, see utils/champions.py"""
+
+    puuid = models.CharField(max_length=78)
+    queue_id = models.IntegerField()  # champions.ALL_QUEUES in the rows of every queue
+    champion_name = models.CharField(max_length=30)
+    matches = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    minutes = models.IntegerField(default=0)
+    kills = models.IntegerField(default=0)
+    deaths = models.IntegerField(default=0)
+    assists = models.IntegerField(default=0)
+    minions = models.IntegerField(default=0)
+    vision = models.IntegerField(default=0)
+    gold = models.BigIntegerField(default=0)
+    damage = models.BigIntegerField(default=0)
+    last_played = models.BigIntegerField(default=0)  # Epoch milliseconds
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["puuid", "queue_id", "champion_name"],
+                name="unique_champion_stat",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["puuid", "queue_id", "-matches", "-wins"],
+                name="championstat_top",
+            ),
+        ]
+
+    def __str__(self):
+        return self.puuid + " " + str(self.queue_id) + " " + self.champion_name
+
+
 class Summoner(models.Model):
 
     summoner = models.CharField(max_length=50)
+    server = models.CharField(max_length=5, blank=True)
+    puuid = models.CharField(max_length=78, blank=True, db_index=True)
+    # Profile and leagues from the last sync, so the profile is rendered without waiting on Riot
+    summoner_json = models.JSONField(default=dict)
+    league_json = models.JSONField(default=dict)
+    synced_at = models.DateTimeField(null=True)
+    # Matchlist sync cursors: newest known match and offset of the history backfill
+    last_game_creation = models.BigIntegerField(null=True)  # Epoch milliseconds
+    backfill_start = models.IntegerField(default=0)
+    backfill_done = models.BooleanField(default=False)
     matches = models.IntegerField(default=0)
     minutes = models.IntegerField(default=0)
-    champions = models.JSONField(default=dict)
     roles = models.JSONField(default=dict)
     stats = models.JSONField(default=dict)
+    # Bumped when the stats change, it's part of the key of the cached stats sidebar
+    stats_version = models.IntegerField(default=0)
 
     class Meta:
         ordering = ["-matches"]
+        # The same name can be taken on every server
+        constraints = [
+            models.UniqueConstraint(
+                fields=["server", "summoner"], name="unique_server_summoner"
+            ),
+        ]
 
     def __str__(self):
         return self.summoner
+
+
+class SyncJob(models.Model):
+    """Summoner sync waiting for, or being run by, the run_worker command"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    server = models.CharField(max_length=5)
+    summoner_name = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    matches_total = models.IntegerField(default=0)
+    matches_done = models.IntegerField(default=0)
+    error = models.CharField(max_length=200, blank=True)
+    # Times the job was put back in the queue while Riot was unavailable
+    attempts = models.IntegerField(default=0)
+    # A job put back in the queue isn't claimed before this time
+    not_before = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["created"]
+        indexes = [
+            models.Index(fields=["status", "created"], name="syncjob_status_created"),
+            models.Index(
+                fields=["summoner_name", "server", "-created"],
+                name="syncjob_summoner_created",
+            ),
+        ]
+
+    def __str__(self):
+        return self.server + "/" + self.summoner_name + " " + self.status
+
+
+class FlightLock(models.Model):
+    """Lock of an operation run by one process at a time, see utils/singleflight.py"""
+
+    key = models.CharField(max_length=150, primary_key=True)
+    acquired = models.DateTimeField()
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,431 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api.models import (
+    ChampionRollup,
+    ChampionStat,
+    Match,
+    Participant,
+    StatBucket,
+    Summoner,
+)
+from api.utils import breaker, databases, metrics, ratelimit, riot, rollups, sync
+
+KEYS = ("euw1", "euw1:summoner-v4.by-name")
+
+
+class RateLimitFileTestCase(SimpleTestCase):
+    """Rate limiter and breakers in a throwaway SQLite file"""
+
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        overridden = override_settings(
+            RIOT_RATE_LIMIT_DB=os.path.join(workdir, "ratelimit.sqlite3"),
+            METRICS_DB=os.path.join(workdir, "metrics.sqlite3"),
+            RIOT_APP_RATE_LIMIT="20:1,100:120",
+            RIOT_BREAKER_THRESHOLD=3,
+            RIOT_BREAKER_COOLDOWN=30,
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        # The connections of the thread are opened again on the new files
+        for module in (ratelimit, metrics):
+            module._local.__dict__.pop("connection", None)
+            self.addCleanup(module._local.__dict__.pop, "connection", None)
+        # Increments of the test aren't flushed to the real file at exit
+        self.addCleanup(metrics.flush)
+
+
+class RateLimitTests(RateLimitFileTestCase):
+    """Buckets of utils/ratelimit.py"""
+
+    def get_windows(self, key):
+        return dict(
+            ratelimit.get_connection().execute(
+                "SELECT window, quota FROM buckets WHERE key = ?", (key,)
+            )
+        )
+
+    def test_configured_limits_until_the_first_response(self):
+        self.assertEqual(ratelimit.reserve(KEYS), 0)
+        self.assertEqual(self.get_windows("euw1"), {1: 20, 120: 100})
+
+    def test_riot_limits_replace_the_configured_ones(self):
+        ratelimit.reserve(KEYS)
+        ratelimit.update(
+            KEYS,
+            200,
+            {
+                "X-App-Rate-Limit": "500:10,30000:600",
+                "X-App-Rate-Limit-Count": "1:10,1:600",
+            },
+        )
+
+        waits = [ratelimit.reserve(KEYS) for _ in range(30)]
+
+        self.assertEqual(self.get_windows("euw1"), {10: 500, 600: 30000})
+        self.assertEqual(waits, [0] * 30)
+
+    def test_wait_once_a_window_is_full(self):
+        for _ in range(20):
+            self.assertEqual(ratelimit.reserve(KEYS), 0)
+        self.assertGreater(ratelimit.reserve(KEYS), 0)
+
+    def test_acquire_waits_for_the_lock_outside_the_event_loop(self):
+        ratelimit.reserve(KEYS)
+        other_process = sqlite3.connect(
+            settings.RIOT_RATE_LIMIT_DB, isolation_level=None
+        )
+        self.addCleanup(other_process.close)
+        other_process.execute("BEGIN IMMEDIATE")
+
+        async def acquire():
+            task = asyncio.ensure_future(ratelimit.acquire(KEYS))
+            started = time.monotonic()
+            await asyncio.sleep(0.05)
+            # The loop kept running while the reservation waited for the lock
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertFalse(task.done())
+            other_process.execute("COMMIT")
+            return await task
+
+        self.assertTrue(asyncio.run(acquire()))
+
+
+class BreakerTests(RateLimitFileTestCase):
+    """States of utils/breaker.py: closed, open, then a single probe"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        patcher = mock.patch("api.utils.breaker.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.assertTrue(breaker.allow("euw1"))
+            breaker.fail("euw1")
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.fail(2)
+        self.assertFalse(breaker.is_open("euw1"))
+
+        self.fail(1)
+
+        self.assertFalse(breaker.allow("euw1"))
+        self.assertTrue(breaker.is_open("EUW1", None))
+        self.assertEqual(breaker.get_open(), {"euw1"})
+        self.assertFalse(breaker.is_open("na1"))
+
+    def test_a_success_resets_the_failures(self):
+        self.fail(2)
+        breaker.succeed("euw1")
+        self.fail(2)
+
+        self.assertTrue(breaker.allow("euw1"))
+        self.assertEqual(breaker.get_state("euw1")[0], 2)
+
+    def test_single_probe_after_the_cooldown(self):
+        self.fail(3)
+        self.now += 30
+
+        self.assertTrue(breaker.allow("euw1"))
+        # The other calls wait for the probe
+        self.assertFalse(breaker.allow("euw1"))
+        self.assertTrue(breaker.is_open("euw1"))
+
+    def test_probe_success_closes(self):
+        self.fail(3)
+        self.now += 30
+        breaker.allow("euw1")
+
+        breaker.succeed("euw1")
+
+        self.assertEqual(breaker.get_state("euw1"), (0, 0))
+        self.assertTrue(breaker.allow("euw1"))
+        self.assertEqual(breaker.get_open(), set())
+
+    def test_probe_failure_opens_for_another_cooldown(self):
+        self.fail(3)
+        self.now += 30
+        breaker.allow("euw1")
+
+        breaker.fail("euw1")
+        self.now += 29
+
+        self.assertFalse(breaker.allow("euw1"))
+        self.now += 1
+        self.assertTrue(breaker.allow("euw1"))
+
+
+@override_settings(RIOT_MAX_ATTEMPTS=3, RIOT_BACKOFF_BASE=0)
+class RetryTests(RateLimitFileTestCase):
+    """Retry policy of riot.get, with the responses of riot.fetch"""
+
+    URL = "http://127.0.0.1:8001/euw1/lol/summoner/v4/summoners/by-name/name"
+
+    def get(self, *statuses):
+        """Status of riot.get's response when fetch answers the statuses in order"""
+        fetch = mock.AsyncMock(
+            side_effect=[SimpleNamespace(status=status) for status in statuses]
+        )
+        with mock.patch("api.utils.riot.fetch", fetch):
+            try:
+                return async_to_sync(riot.get)(self.URL, "summoner-v4.by-name").status
+            finally:
+                self.calls = fetch.await_count
+
+    def test_server_errors_are_tried_again(self):
+        self.assertEqual(self.get(503, 429, 200), 200)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(breaker.get_state("euw1"), (0, 0))
+
+    def test_not_found_is_returned(self):
+        self.assertEqual(self.get(404), 404)
+        self.assertEqual(self.calls, 1)
+
+    def test_client_errors_are_raised_at_once(self):
+        with self.assertRaises(riot.RiotError) as raised:
+            self.get(403)
+
+        self.assertNotIsInstance(raised.exception, riot.RiotUnavailable)
+        self.assertEqual(raised.exception.status, 403)
+        self.assertEqual(self.calls, 1)
+
+    def test_unavailable_after_the_attempts(self):
+        with self.assertRaises(riot.RiotUnavailable):
+            self.get(500, 502, 503)
+
+        self.assertEqual(self.calls, 3)
+        # As many failures as the threshold, later calls fail at once
+        self.assertTrue(breaker.is_open("euw1"))
+        with self.assertRaises(riot.RiotUnavailable):
+            self.get(200)
+        self.assertEqual(self.calls, 0)
+
+
+class FeedPageTests(TestCase):
+    """Keyset pages of databases.get_feed_page"""
+
+    def setUp(self):
+        # Two matches per creation time, the match id breaks the tie
+        self.expected = []
+        for number in range(9):
+            match_id = "EUW1_" + str(100 + number)
+            creation = 1669000000000 + number // 2 * 1000
+            Match.objects.create(
+                match_id=match_id,
+                queue_id=420,
+                game_creation=creation,
+                hydrated=True,
+                card={"patch": "13.1.1"},
+            )
+            Participant.objects.create(
+                match_id=match_id,
+                puuid="puuid",
+                game_creation=creation,
+                hydrated=True,
+            )
+            self.expected.insert(0, match_id)
+
+        # Custom and tutorial matches aren't listed, newer queues are
+        for match_id, queue_id in [("EUW1_1", 0), ("EUW1_2", 2000), ("EUW1_3", 2300)]:
+            Match.objects.create(
+                match_id=match_id,
+                queue_id=queue_id,
+                game_creation=1669000000500,
+                hydrated=True,
+            )
+            Participant.objects.create(
+                match_id=match_id,
+                puuid="puuid",
+                game_creation=1669000000500,
+                hydrated=True,
+            )
+        # Between the matches created at 1669000001000 and 1669000000000
+        self.expected.insert(self.expected.index("EUW1_101"), "EUW1_3")
+
+    def test_pages_list_every_match_once_newest_first(self):
+        pages = []
+        cursor = None
+        while True:
+            participants, cursor = databases.get_feed_page("puuid", cursor, size=4)
+            pages.append([participant.match_id for participant in participants])
+            if cursor is None:
+                break
+
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_cursor_is_the_last_card_of_the_page(self):
+        participants, cursor = databases.get_feed_page("puuid", size=3)
+        last = participants[-1]
+
+        self.assertEqual(cursor, str(last.game_creation) + "_" + last.match_id)
+        self.assertEqual(last.match.card, {"patch": "13.1.1"})
+
+    def test_last_page_has_no_cursor(self):
+        participants, cursor = databases.get_feed_page("puuid", size=10)
+
+        self.assertEqual(len(participants), 10)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        for cursor in ["EUW1_100", "nothing"]:
+            with self.assertRaises(ValueError):
+                databases.get_feed_page("puuid", cursor)
+
+
+class SyncMatchlistTests(TestCase):
+    """Cursors of sync.sync_matchlist and sync.backfill_matchlist"""
+
+    def setUp(self):
+        self.summoner_db = Summoner.objects.create(
+            server="EUW1", summoner="name", puuid="puuid"
+        )
+        # (match id, creation in epoch milliseconds), newest first
+        self.history = []
+        self.play(250)
+
+        patcher = mock.patch("api.utils.interactions.get_matchlist", self.get_matchlist)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def play(self, matches):
+        """Add newer matches to the history, one every hour"""
+        newest = self.history[0][1] if self.history else 1669000000000
+        start = len(self.history)
+        for number in range(matches):
+            self.history.insert(
+                0, ("EUW1_" + str(start + number), newest + (number + 1) * 3600000)
+            )
+
+    async def get_matchlist(self, server, puuid, start=0, count=100, start_time=None):
+        """Riot's matchlist of the history"""
+        matchlist = [
+            match_id
+            for match_id, creation in self.history
+            if start_time is None or creation // 1000 >= start_time
+        ]
+        return matchlist[start : start + count]
+
+    def hydrate(self, match_id):
+        """What the hydration saves of the match, the creation is the sync cursor"""
+        creation = dict(self.history)[match_id]
+        Match.objects.filter(match_id=match_id).update(
+            game_creation=creation, hydrated=True
+        )
+        self.summoner_db.last_game_creation = creation
+
+    def test_first_sync_adds_a_page_then_backfill_the_rest(self):
+        new_matches = async_to_sync(sync.sync_matchlist)("EUW1", self.summoner_db)
+
+        self.assertEqual(new_matches, [match_id for match_id, _ in self.history[:100]])
+        self.assertEqual(self.summoner_db.backfill_start, 100)
+        self.assertFalse(self.summoner_db.backfill_done)
+
+        added = async_to_sync(sync.backfill_matchlist)(
+            "EUW1", self.summoner_db, pages=5
+        )
+
+        self.assertEqual(added, 150)
+        self.assertEqual(self.summoner_db.backfill_start, 250)
+        self.assertTrue(self.summoner_db.backfill_done)
+        self.assertEqual(Participant.objects.filter(puuid="puuid").count(), 250)
+
+    def test_later_sync_adds_the_new_matches_and_moves_the_backfill(self):
+        async_to_sync(sync.sync_matchlist)("EUW1", self.summoner_db)
+        self.hydrate(self.history[0][0])
+        self.play(5)
+
+        # Pages of two ids: the five new matches and the newest known one
+        new_matches = async_to_sync(sync.sync_matchlist)(
+            "EUW1", self.summoner_db, count=2
+        )
+
+        self.assertEqual(new_matches, [match_id for match_id, _ in self.history[:5]])
+        self.assertEqual(self.summoner_db.backfill_start, 105)
+
+        async_to_sync(sync.backfill_matchlist)("EUW1", self.summoner_db, pages=5)
+
+        # Every match once, none skipped by the shifted history
+        self.assertEqual(Participant.objects.filter(puuid="puuid").count(), 255)
+        self.assertTrue(self.summoner_db.backfill_done)
+
+    def test_sync_without_new_matches(self):
+        async_to_sync(sync.sync_matchlist)("EUW1", self.summoner_db)
+        self.hydrate(self.history[0][0])
+
+        new_matches = async_to_sync(sync.sync_matchlist)("EUW1", self.summoner_db)
+
+        self.assertEqual(new_matches, [])
+        self.assertEqual(self.summoner_db.backfill_start, 100)
+
+
+class RollupTests(TestCase):
+    """Claim and increments of rollups.add_matches"""
+
+    def add_match(self, match_id, champion_ids):
+        Match.objects.create(
+            match_id=match_id,
+            queue_id=420,
+            game_mode="CLASSIC",
+            game_creation=1669000000000,
+            game_duration=1800,
+            patch="13.1.1",
+            hydrated=True,
+        )
+        for number, champion_id in enumerate(champion_ids):
+            Participant.objects.create(
+                match_id=match_id,
+                puuid="puuid" + str(number),
+                game_creation=1669000000000,
+                champion_id=champion_id,
+                champion_name="Champion" + str(champion_id),
+                team_position="MIDDLE" if number % 5 == 2 else "TOP",
+                kills=number,
+                win=number < 5,
+                hydrated=True,
+            )
+
+    def test_matches_are_counted_once(self):
+        self.add_match("EUW1_1", range(10))
+        self.add_match("EUW1_2", range(10))
+
+        self.assertEqual(rollups.add_matches(["EUW1_1"]), 1)
+        self.assertEqual(rollups.add_matches(["EUW1_1", "EUW1_2"]), 1)
+        self.assertEqual(rollups.add_matches(["EUW1_1", "EUW1_2"]), 0)
+
+        rollup = ChampionRollup.objects.get(champion_id=2, role="MIDDLE")
+        self.assertEqual((rollup.matches, rollup.wins, rollup.kills), (2, 2, 4))
+        self.assertEqual(rollup.duration, 3600)
+        self.assertEqual(rollups.get_tier_list("13.1.1", 420)["matches"], 2)
+        self.assertEqual(StatBucket.objects.get(puuid="puuid6", role="top").matches, 2)
+        # A row for the queue and one for every queue
+        self.assertEqual(
+            set(
+                ChampionStat.objects.filter(puuid="puuid6").values_list(
+                    "queue_id", "matches"
+                )
+            ),
+            {(420, 2), (-1, 2)},
+        )
+
+    def test_matches_not_hydrated_are_not_claimed(self):
+        self.add_match("EUW1_1", range(10))
+        Match.objects.filter(match_id="EUW1_1").update(hydrated=False)
+
+        self.assertEqual(rollups.add_matches(["EUW1_1"]), 0)
+        self.assertFalse(Match.objects.get(match_id="EUW1_1").rolled_up)
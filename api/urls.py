@@ -4,7 +4,10 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("champions/", views.champion_stats),
+    path("metrics", views.prometheus_metrics),
     path("<str:server>/<str:summoner_name>/", views.user_info),
     path("<str:server>/<str:summoner_name>/refresh", views.summoner_stats_refresh),
+    path("<str:server>/<str:summoner_name>/matches", views.summoner_matches),
     path("<str:server>/<str:summoner_name>/<str:match_id>/", views.get_match_data),
 ]
\ No newline at end of file
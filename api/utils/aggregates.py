@@ -0,0 +1,269 @@
+"""
+Summoner stats computed from the stored participants, in one vectorized pass.
+
+The participants of the summoners are loaded as column arrays, every total is a
+sum over a mask or a bincount, and the ratios shown in the profile are only
+derived once from the final totals.
+"""
+
+import numpy as np
+from django.conf import settings
+
+from api.models import Participant, Summoner
+from api.utils import helpers
+
+ROLES = ["top", "jungle", "middle", "bottom", "utility"]
+STATS = ["kills", "deaths", "assists", "minions", "vision"]
+
+# Summoner fields written by a rebuild, champions are in the ChampionStat table
+STAT_FIELDS = ["matches", "minutes", "roles", "stats"]
+
+# Participant columns, loaded in this order
+COLUMNS = [
+    "puuid",
+    "champion_name",
+    "team_position",
+    "kills",
+    "deaths",
+    "assists",
+    "minions",
+    "vision",
+    "gold",
+    "damage",
+    "win",
+    "match__game_duration",
+    "match__game_creation",
+]
+
+
+def get_columns(puuids):
+    """Column arrays of the summoners' hydrated normal and ranked matches
+
+    Matches without position, when a player went afk and remaked, aren't counted.
+
+    Returns:
+        Dictionary with the columns of each puuid, summoners without matches are missing
+    """
+
+    rows = list(
+        Participant.objects.filter(
+            puuid__in=puuids, hydrated=True, match__game_mode="CLASSIC"
+        )
+        .exclude(team_position="")
+        .values_list(*COLUMNS)
+    )
+    if not rows:
+        return {}
+
+    values = dict(zip(COLUMNS, zip(*rows)))
+    columns = {
+        "champion": np.array(values["champion_name"]),
+        "role": np.char.lower(np.array(values["team_position"])),
+        "win": np.array(values["win"], dtype=bool),
+        # Same minutes as the match cards, e.g: 1774 seconds -> 30
+        "minutes": np.rint(
+            np.array(values["match__game_duration"], dtype=np.float64) / 60
+        ).astype(np.int64),
+        "game_creation": np.array(values["match__game_creation"], dtype=np.int64),
+    }
+    for stat in STATS + ["gold", "damage"]:
+        columns[stat] = np.array(values[stat], dtype=np.int64)
+
+    # Group the rows of each summoner together
+    puuid = np.array(values["puuid"])
+    order = np.argsort(puuid, kind="stable")
+    puuids_found, starts = np.unique(puuid[order], return_index=True)
+
+    return {
+        str(found): {name: column[order][start:end] for name, column in columns.items()}
+        for found, start, end in zip(
+            puuids_found, starts, list(starts[1:]) + [len(order)]
+        )
+    }
+
+
+def divide(total, count, digits=2):
+    """Rounded ratio, 0 if there is nothing to divide by"""
+    return round(float(total) / float(count), digits) if count else 0
+
+
+def get_kda(kills, deaths, assists):
+    """(kills + assists) / deaths, or kills + assists without deaths"""
+    if deaths:
+        return round(float(kills + assists) / float(deaths), 2)
+    return int(kills + assists)
+
+
+# Totals kept for each champion and role, see group_columns
+TOTALS = ["matches", "wins", "minutes"] + STATS + ["gold", "damage"]
+
+
+def group_columns(columns):
+    """Totals of the column arrays for each champion and role
+
+    Returns:
+        List of dictionaries with the champion, role, TOTALS and last_played
+    """
+
+    if columns is None:
+        return []
+
+    names, group = np.unique(
+        np.char.add(np.char.add(columns["champion"], "\n"), columns["role"]),
+        return_inverse=True,
+    )
+    count = len(names)
+    totals = {
+        name: np.bincount(group, weights=columns[name], minlength=count)
+        for name in ["win", "minutes"] + STATS + ["gold", "damage"]
+    }
+    matches = np.bincount(group, minlength=count)
+    last_played = np.zeros(count, dtype=np.int64)
+    np.maximum.at(last_played, group, columns["game_creation"])
+
+    groups = []
+    for i, name in enumerate(names):
+        champion, role = str(name).split("\n")
+        values = {
+            "champion": champion,
+            "role": role,
+            "matches": int(matches[i]),
+            "wins": int(totals["win"][i]),
+            "last_played": int(last_played[i]),
+        }
+        for total in ["minutes"] + STATS + ["gold", "damage"]:
+            values[total] = int(totals[total][i])
+        groups.append(values)
+    return groups
+
+
+def get_champion_stats(total, matches):
+    """Stats of a champion from its TOTALS and last_played
+
+    Args:
+        total       (dict)
+        matches     (int)       Matches of the summoner, for the play rate
+    """
+    return {
+        "num": total["matches"],
+        "kills": total["kills"],
+        "assists": total["assists"],
+        "deaths": total["deaths"],
+        "kda": get_kda(total["kills"], total["deaths"], total["assists"]),
+        "wins": total["wins"],
+        "losses": total["matches"] - total["wins"],
+        "win_rate": round(total["wins"] / total["matches"] * 100, 2),
+        "play_rate": divide(total["matches"], matches),
+        "minions": total["minions"],
+        "vision": total["vision"],
+        "gold": total["gold"],
+        "damage": total["damage"],
+        "last_played": helpers.get_date_by_timestamp(total["last_played"]),
+    }
+
+
+def summarize(groups):
+    """Overall and role stats from the totals of each champion and role
+
+    Returns:
+        Dictionary with the values of the STAT_FIELDS
+    """
+
+    matches = sum(group["matches"] for group in groups)
+    minutes = sum(group["minutes"] for group in groups)
+
+    stats = {}
+    for stat in STATS:
+        total = sum(group[stat] for group in groups)
+        stats[stat] = {
+            "total": total,
+            "per_min": divide(total, minutes),
+            "per_match": divide(total, matches),
+        }
+
+    roles = {}
+    for role in ROLES:
+        num = sum(group["matches"] for group in groups if group["role"] == role)
+        wins = sum(group["wins"] for group in groups if group["role"] == role)
+        roles[role] = {
+            "num": num,
+            "win_rate": int(wins / num * 100) if num else 0,
+            "wins": wins,
+            "losses": num - wins,
+        }
+
+    return {
+        "matches": matches,
+        "minutes": minutes,
+        "roles": roles,
+        "stats": stats,
+    }
+
+
+def get_top_champions(groups, matches, count=None):
+    """Most played champions of the groups, then the ones with more wins
+
+    The same order as champions.get_top, for the stats of a queue and window.
+
+    Args:
+        groups      (list)      Totals of each champion and role
+        matches     (int)       Matches of the summoner, for the play rate
+        count       (int)       Number of champions, settings.TOP_CHAMPIONS by default
+
+    Returns:
+        Dictionary with the stats of each champion, in order
+    """
+
+    totals = {}
+    for group in groups:
+        champion = totals.setdefault(
+            group["champion"], dict.fromkeys(TOTALS + ["last_played"], 0)
+        )
+        for total in TOTALS:
+            champion[total] += group[total]
+        champion["last_played"] = max(champion["last_played"], group["last_played"])
+
+    top = sorted(
+        totals.items(),
+        key=lambda item: (item[1]["matches"], item[1]["wins"]),
+        reverse=True,
+    )
+    return {
+        name: get_champion_stats(total, matches)
+        for name, total in top[: count or settings.TOP_CHAMPIONS]
+    }
+
+
+def compute_stats(columns):
+    """Overall and role stats of a summoner from its column arrays
+
+    Returns:
+        Dictionary with the values of the STAT_FIELDS
+    """
+    return summarize(group_columns(columns))
+
+
+def rebuild_summoners(summoners):
+    """Compute again the stats of the summoners from their participants, in two queries
+
+    Only the summoners whose stats changed are saved, with a new stats_version.
+    """
+
+    columns = get_columns([summoner_db.puuid for summoner_db in summoners])
+    changed = []
+    for summoner_db in summoners:
+        stats = compute_stats(columns.get(summoner_db.puuid))
+        if any(getattr(summoner_db, field) != stats[field] for field in STAT_FIELDS):
+            for field in STAT_FIELDS:
+                setattr(summoner_db, field, stats[field])
+            summoner_db.stats_version += 1
+            changed.append(summoner_db)
+
+    if changed:
+        Summoner.objects.bulk_update(changed, STAT_FIELDS + ["stats_version"])
+    return summoners
+
+
+def rebuild_summoner(summoner_db):
+    """Compute again the stats of a summoner from its participants"""
+    return rebuild_summoners([summoner_db])[0]
@@ -0,0 +1,94 @@
+"""
+Circuit breaker of each Riot host, shared by every process.
+
+After RIOT_BREAKER_THRESHOLD failed calls in a row (5xx or no response) to a
+routing value, the breaker opens and calls to it fail at once for
+RIOT_BREAKER_COOLDOWN seconds. Then a single call is let through: its success
+closes the breaker, its failure opens it for another cooldown. The state is
+kept next to the rate limiter's buckets, so the web processes know when the
+worker's calls fail.
+"""
+
+import time
+
+from django.conf import settings
+
+from api.utils import ratelimit
+
+
+def get_state(routing):
+    """Failures in a row and time the breaker opened until, 0 if it's closed"""
+    row = (
+        ratelimit.get_connection()
+        .execute("SELECT failures, opened FROM breakers WHERE key = ?", (routing,))
+        .fetchone()
+    )
+    return row or (0, 0)
+
+
+def allow(routing):
+    """Whether a call to the routing value can be sent, once as a probe after a cooldown"""
+
+    failures, opened = get_state(routing)
+    if failures < settings.RIOT_BREAKER_THRESHOLD:
+        return True
+
+    now = time.time()
+    if opened > now:
+        return False
+
+    # Calls of the other processes wait for this probe until another cooldown
+    return (
+        ratelimit.get_connection()
+        .execute(
+            "UPDATE breakers SET opened = ? WHERE key = ? AND opened = ?",
+            (now + settings.RIOT_BREAKER_COOLDOWN, routing, opened),
+        )
+        .rowcount
+        == 1
+    )
+
+
+def succeed(routing):
+    """Close the breaker after a call that got an answer"""
+    # Most calls succeed with a closed breaker, read before writing
+    if get_state(routing)[0]:
+        ratelimit.get_connection().execute(
+            "DELETE FROM breakers WHERE key = ?", (routing,)
+        )
+
+
+def fail(routing):
+    """Count a failed call, opening the breaker at RIOT_BREAKER_THRESHOLD"""
+    ratelimit.get_connection().execute(
+        "INSERT INTO breakers VALUES (?, 1, 0) "
+        "ON CONFLICT (key) DO UPDATE SET failures = failures + 1, "
+        "opened = CASE WHEN failures + 1 >= ? AND opened <= ? THEN ? ELSE opened END",
+        (
+            routing,
+            settings.RIOT_BREAKER_THRESHOLD,
+            time.time(),
+            time.time() + settings.RIOT_BREAKER_COOLDOWN,
+        ),
+    )
+
+
+def is_open(*routings):
+    """Whether calls to any of the routing values fail at once, None ones are skipped"""
+    now = time.time()
+    for routing in filter(None, routings):
+        failures, opened = get_state(routing.lower())
+        if failures >= settings.RIOT_BREAKER_THRESHOLD and opened > now:
+            return True
+    return False
+
+
+def get_open():
+    """Routing values whose calls fail at once, e.g: {"euw1"}"""
+    return {
+        routing
+        for (routing,) in ratelimit.get_connection().execute(
+            "SELECT key FROM breakers WHERE failures >= ? AND opened > ?",
+            (settings.RIOT_BREAKER_THRESHOLD, time.time()),
+        )
+    }
@@ -0,0 +1,45 @@
+"""
+Cache of the data computed from Riot's responses, shared by every visitor.
+
+Entries are keyed by kind, platform and identity, e.g: match_summary:EUW1:EUW1_6154384371,
+and expire after the TTL of their kind in settings.RIOT_CACHE_TTLS. The backend is
+the "riot" cache of settings.CACHES, chosen with RIOT_CACHE_BACKEND.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.utils import interactions, metrics
+
+
+def get_key(kind, platform, identity):
+    """Key of an object, e.g: match_summary:EUW1:EUW1_6154384371"""
+    return kind + ":" + platform.upper() + ":" + str(identity)
+
+
+async def get(kind, platform, identity):
+    """Cached object, None if it isn't cached or it expired"""
+    value = await caches["riot"].aget(get_key(kind, platform, identity))
+    metrics.add(
+        "cache_requests_total", cache=kind, result="miss" if value is None else "hit"
+    )
+    return value
+
+
+async def set(kind, platform, identity, value):
+    """Cache the object for the TTL of its kind"""
+    await caches["riot"].aset(
+        get_key(kind, platform, identity), value, settings.RIOT_CACHE_TTLS[kind]
+    )
+
+
+async def load_match_summary(server, match_id, match_json):
+    """Match info with the rank of each player, computed once for every visitor"""
+
+    match_data = await get("match_summary", server, match_id)
+    if match_data is None:
+        match_data = await interactions.match_summary(server, match_json)
+        # Ranks Riot couldn't answer are tried again by the next visitor
+        if not match_data.get("ranks_missing"):
+            await set("match_summary", server, match_id, match_data)
+    return match_data
@@ -0,0 +1,65 @@
+"""
+Champion stats of every player by queue, in a table of counters.
+
+The rows are incremented when a match is added to the champion rollups, so
+each match is counted once. Rows with queue_id ALL_QUEUES sum the other rows of
+the player, so the profile reads its top champions in any queue with the
+(puuid, queue_id, -matches, -wins) index.
+"""
+
+from django.conf import settings
+
+from api.models import ChampionStat
+from api.utils import aggregates, windows
+
+ALL_QUEUES = -1
+KEY_FIELDS = ["puuid", "queue_id", "champion_name"]
+
+
+def add_matches(match_ids):
+    """Add the counted participants of the matches to their champion stats
+
+    Called by rollups.add_matches, which adds each match once.
+    """
+
+    participants = list(windows.get_participants().filter(match_id__in=match_ids))
+    keys = [
+        lambda participant: (
+            participant["puuid"],
+            participant["match__queue_id"],
+            participant["champion_name"],
+        ),
+        lambda participant: (
+            participant["puuid"],
+            ALL_QUEUES,
+            participant["champion_name"],
+        ),
+    ]
+    for key in keys:
+        windows.increment(
+            ChampionStat, KEY_FIELDS, windows.group_participants(participants, key)
+        )
+
+
+def get_top(puuid, matches, queue_id=ALL_QUEUES, count=None):
+    """Most played champions of the summoner, then the ones with more wins
+
+    Args:
+        puuid       (string)
+        matches     (int)       Matches of the summoner in the queue, for the play rate
+        queue_id    (int)
+        count       (int)       Number of champions, settings.TOP_CHAMPIONS by default
+
+    Returns:
+        Dictionary with the stats of each champion, in order
+    """
+
+    rows = (
+        ChampionStat.objects.filter(puuid=puuid, queue_id=queue_id)
+        .order_by("-matches", "-wins")
+        .values("champion_name", "last_played", *aggregates.TOTALS)
+    )
+    return {
+        row["champion_name"]: aggregates.get_champion_stats(row, matches)
+        for row in rows[: count or settings.TOP_CHAMPIONS]
+    }
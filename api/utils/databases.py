@@ -1,151 +1,56 @@
 """Functions that performs computation on the database"""
 
-from api.models import Summoner, Match
-
-def update_summoner_db(summoner_db, player_summary_list):
-    for player_summary in player_summary_list:
-        position_dict = player_summary["teamPosition"].lower()
-        # Only if it's a ranked or normal match, not urf, not aram...
-        # and position isn't empty, which happens when player went afk and remaked
-        if player_summary["gameMode"] == "CLASSIC" and position_dict != "":
-            summoner_db.roles[position_dict]["num"] += 1
-
-            if player_summary["win"]:
-                summoner_db.roles[position_dict]["wins"] += 1
-            else:
-                summoner_db.roles[position_dict]["losses"] += 1
-
-            summoner_db.roles[position_dict]["win_rate"] = int(
-                summoner_db.roles[position_dict]["wins"]
-                / summoner_db.roles[position_dict]["num"]
-                * 100
-            )
-
-            summoner_db = add_database_ranked_stats(summoner_db, player_summary)
-            summoner_db = add_database_champion_stats(summoner_db, player_summary)
-
-    # order champions in database by number of matches, then by win rate and then by kda
-    summoner_db.champions = dict(
-        sorted(
-            summoner_db.champions.items(),
-            key=lambda item: (item[1]["num"], item[1]["win_rate"], item[1]["kda"]),
-            reverse=True,
-        )
-    )
-    return summoner_db
-
-
-def add_database_ranked_stats(summoner_db, summoner_json):
-    summoner_db.matches += 1
-    summoner_db.minutes += summoner_json["gameDuration"]
-
-    summoner_db.stats["kills"]["total"] += summoner_json["kills"]
-    summoner_db.stats["kills"]["per_min"] = round(
-        summoner_db.stats["kills"]["total"] / summoner_db.minutes, 2
-    )
-    summoner_db.stats["kills"]["per_match"] = round(
-        summoner_db.stats["kills"]["total"] / summoner_db.matches, 2
-    )
+from django.db import connection
+from django.db.models import Q
 
-    summoner_db.stats["assists"]["total"] += summoner_json["assists"]
-    summoner_db.stats["assists"]["per_min"] = round(
-        summoner_db.stats["assists"]["total"] / summoner_db.minutes, 2
-    )
-    summoner_db.stats["assists"]["per_match"] = round(
-        summoner_db.stats["assists"]["total"] / summoner_db.matches, 2
-    )
-
-    summoner_db.stats["deaths"]["total"] += summoner_json["deaths"]
-    summoner_db.stats["deaths"]["per_min"] = round(
-        summoner_db.stats["deaths"]["total"] / summoner_db.minutes, 2
-    )
-    summoner_db.stats["deaths"]["per_match"] = round(
-        summoner_db.stats["deaths"]["total"] / summoner_db.matches, 2
-    )
-
-    summoner_db.stats["minions"]["total"] += (
-        summoner_json["totalMinionsKilled"] + summoner_json["neutralMinionsKilled"]
-    )
-    summoner_db.stats["minions"]["per_min"] = round(
-        summoner_db.stats["minions"]["total"] / summoner_db.minutes, 2
-    )
-    summoner_db.stats["minions"]["per_match"] = round(
-        summoner_db.stats["minions"]["total"] / summoner_db.matches, 2
-    )
+from api.models import Summoner, Match, Participant
+from api.utils import metrics
 
-    summoner_db.stats["vision"]["total"] += summoner_json["visionScore"]
-    summoner_db.stats["vision"]["per_min"] = round(
-        summoner_db.stats["vision"]["total"] / summoner_db.minutes, 2
-    )
-    summoner_db.stats["vision"]["per_match"] = round(
-        summoner_db.stats["vision"]["total"] / summoner_db.matches, 2
-    )
+# Columns filled from the JSON returned by Riot
+MATCH_FIELDS = ["queue_id", "game_mode", "game_creation", "game_duration", "patch"]
+PARTICIPANT_FIELDS = [
+    "summoner_name",
+    "champion_id",
+    "champion_name",
+    "team_position",
+    "kills",
+    "deaths",
+    "assists",
+    "minions",
+    "vision",
+    "gold",
+    "damage",
+    "win",
+    "game_creation",
+]
 
-    return summoner_db
-
-
-def add_database_champion_stats(summoner_db, summoner_json):
-    kills = summoner_json["kills"]
-    assists = summoner_json["assists"]
-    deaths = summoner_json["deaths"]
-    if summoner_json["championName"] not in summoner_db.champions:
-        summoner_db.champions[summoner_json["championName"]] = {
-            "num": 1,
-            "kills": kills,
-            "assists": assists,
-            "deaths": deaths,
-            "kda": round((kills + assists) / deaths, 2)
-            if deaths != 0
-            else kills + assists,
-            "wins": 1 if summoner_json["win"] else 0,
-            "losses": 1 if not summoner_json["win"] else 0,
-            "win_rate": 100 if summoner_json["win"] else 0,
-            "play_rate": 1 / summoner_db.matches,
-            "minions": summoner_json["totalMinionsKilled"]
-            + summoner_json["neutralMinionsKilled"],
-            "vision": summoner_json["visionScore"],
-            "gold": summoner_json["goldEarned"],
-            "damage": summoner_json["totalDamageDealtToChampions"],
-            "last_played": summoner_json["gameCreation"],
-        }
-    else:
-        champion_data = summoner_db.champions[summoner_json["championName"]]
-        champion_data["num"] += 1
-        champion_data["kills"] += kills
-        champion_data["assists"] += assists
-        champion_data["deaths"] += deaths
-        if champion_data["deaths"] != 0:
-            champion_data["kda"] = round(
-                (champion_data["kills"] + champion_data["assists"])
-                / champion_data["deaths"],
-                2,
-            )
-        else:
-            champion_data["kda"] = champion_data["kills"] + champion_data["assists"]
-        if summoner_json["win"]:
-            champion_data["wins"] += 1
-        else:
-            champion_data["losses"] += 1
-        champion_data["win_rate"] = round(
-            champion_data["wins"] / champion_data["num"] * 100, 2
-        )
-        champion_data["play_rate"] = round(
-            champion_data["num"] / summoner_db.matches, 2
-        )
-        champion_data["minions"] += (
-            summoner_json["totalMinionsKilled"] + summoner_json["neutralMinionsKilled"]
-        )
-        champion_data["vision"] += summoner_json["visionScore"]
-        champion_data["gold"] += summoner_json["goldEarned"]
-        champion_data["damage"] += summoner_json["totalDamageDealtToChampions"]
-        champion_data["last_played"] = summoner_json["gameCreation"]
-    return summoner_db
+# Keys of the player summary shown in the match card
+CARD_FIELDS = [
+    "win",
+    "teamPosition",
+    "championId",
+    "summoner_spell_1",
+    "summoner_spell_2",
+    "rune_primary",
+    "rune_secondary",
+    "kills",
+    "deaths",
+    "assists",
+    "kda",
+    "items",
+    "cs",
+    "cs_per_min",
+    "gold_short",
+    "damage_short",
+]
 
 
-def create_user_db(summoner_name):
+def create_user_db(server, summoner_name, puuid):
     """Create user in database"""
     Summoner.objects.create(
+        server=server,
         summoner=summoner_name,
+        puuid=puuid,
         stats={
             "kills": {"total": 0, "per_min": 0, "per_match": 0},
             "deaths": {"total": 0, "per_min": 0, "per_match": 0},
@@ -163,51 +68,249 @@ def create_user_db(summoner_name):
     )
 
 
-def add_matches_to_db(matchlist, summoner_name):
-    """Add matches to database"""
-    add_match_bulk_list = []
-    for match in matchlist:
-        # if match id with summoner name not found, create object in database
-        if Match.objects.filter(match_id=match, summoner=summoner_name).exists():
-            break
-        add_match_bulk_list.append(Match(match_id=match, summoner=summoner_name))
-    Match.objects.bulk_create(add_match_bulk_list)
-
-
-def find_matches_not_in_db(matchlist, summoner_name):
-    """List of match ids which are not in database"""
-    summary_not_in_database = []
-    for match in matchlist:
-        # If match summary not in database, create object in database
-        if Match.objects.filter(
-            match_id=match, summoner=summoner_name, match_json__exact={}
-        ).exists():
-            summary_not_in_database.append(match)
-            # Limit to 10 for lazy load pagination
-            if len(summary_not_in_database) == 10:
-                break
-    return summary_not_in_database
-
-
-def save_matches_to_db(match_summary_list, summoner_name):
-    """Save matches to database"""
-    bulk_save_summary_list = []
-    for match in match_summary_list:
-        match_object = Match.objects.get(
-            match_id=match["metadata"]["matchId"], summoner=summoner_name
+def get_match_fields(match_json):
+    """Columns of the match table taken from the match json"""
+    info = match_json["info"]
+    return {
+        "queue_id": info["queueId"],
+        "game_mode": info["gameMode"],
+        "game_creation": info["gameCreation"],
+        "game_duration": info["gameDuration"],
+        "patch": match_json.get("patch", ""),
+    }
+
+
+def get_match_card(match_json):
+    """Fields of the match shown in the match card"""
+    return {
+        "match_mode": match_json.get("match_mode", ""),
+        "game_mode": match_json["info"]["gameMode"],
+        "date": match_json.get("date", ""),
+        "patch": match_json.get("patch", ""),
+        "matchups": [
+            [
+                {
+                    "championId": participant["championId"],
+                    "summonerName": participant["summonerName"],
+                }
+                for participant in matchup
+            ]
+            for matchup in match_json["info"].get("matchups", [])
+        ],
+    }
+
+
+def get_participant_card(player_summary):
+    """Fields of the player summary shown in the match card"""
+    card = {field: player_summary.get(field) for field in CARD_FIELDS}
+    card["kill_participation"] = player_summary.get("challenges", {}).get(
+        "kill_participation_percentage", "ERROR"
+    )
+    return card
+
+
+def get_participant_fields(player_summary):
+    """Columns of the participant table taken from the player summary"""
+    return {
+        "summoner_name": player_summary["summonerName"],
+        "champion_id": player_summary["championId"],
+        "champion_name": player_summary["championName"],
+        "team_position": player_summary["teamPosition"],
+        "kills": player_summary["kills"],
+        "deaths": player_summary["deaths"],
+        "assists": player_summary["assists"],
+        "minions": player_summary["totalMinionsKilled"]
+        + player_summary["neutralMinionsKilled"],
+        "vision": player_summary["visionScore"],
+        "gold": player_summary["goldEarned"],
+        "damage": player_summary["totalDamageDealtToChampions"],
+        "win": player_summary["win"],
+        "game_creation": player_summary.get("gameCreationTimestamp"),
+    }
+
+
+def add_matches_to_db(matchlist, puuid):
+    """Add matches to database
+
+    Returns:
+        List with the match ids that weren't in the summoner's matches
+    """
+    matches_in_database = set(
+        Participant.objects.filter(puuid=puuid, match_id__in=matchlist).values_list(
+            "match_id", flat=True
+        )
+    )
+    new_matches = [match for match in matchlist if match not in matches_in_database]
+
+    # The match is already stored if it's in another summoner's matchlist
+    Match.objects.bulk_create(
+        [Match(match_id=match) for match in new_matches], ignore_conflicts=True
+    )
+    Participant.objects.bulk_create(
+        [Participant(match_id=match, puuid=puuid) for match in new_matches],
+        ignore_conflicts=True,
+    )
+    return new_matches
+
+
+def find_matches_not_in_db(puuid, limit=10):
+    """List of the newest match ids of the summoner without player summary in database"""
+    return list(
+        Participant.objects.filter(puuid=puuid, hydrated=False).values_list(
+            "match_id", flat=True
+        )[:limit]
+    )
+
+
+def increment(model, key_fields, rows, sum_fields, max_fields=(), insert_fields=()):
+    """Add the totals of each row to the row with its key, inserted if it's missing
+
+    A single INSERT ... ON CONFLICT DO UPDATE sent with executemany, the sums are
+    done by the database so concurrent workers don't overwrite each other.
+
+    Args:
+        model           (Model)     Table of totals, unique on the key fields
+        key_fields      (list)
+        rows            (list)      Dictionaries with the value of every field
+        sum_fields      (list)      Fields added to the row's, e.g: matches
+        max_fields      (list)      Fields kept at their greatest value, e.g: last_played
+        insert_fields   (list)      Fields only set by the insert, e.g: champion_name
+    """
+
+    if not rows:
+        return
+
+    fields = [*key_fields, *insert_fields, *sum_fields, *max_fields]
+    columns = {
+        field: connection.ops.quote_name(model._meta.get_field(field).column)
+        for field in fields
+    }
+    greatest = "MAX" if connection.vendor == "sqlite" else "GREATEST"
+    updates = [
+        columns[field] + " = " + columns[field] + " + excluded." + columns[field]
+        for field in sum_fields
+    ] + [
+        columns[field]
+        + " = "
+        + greatest
+        + "("
+        + columns[field]
+        + ", excluded."
+        + columns[field]
+        + ")"
+        for field in max_fields
+    ]
+    sql = (
+        "INSERT INTO "
+        + connection.ops.quote_name(model._meta.db_table)
+        + " ("
+        + ", ".join(columns.values())
+        + ") VALUES ("
+        + ", ".join(["%s"] * len(fields))
+        + ") ON CONFLICT ("
+        + ", ".join(columns[field] for field in key_fields)
+        + ") DO UPDATE SET "
+        + ", ".join(updates)
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[row[field] for field in fields] for row in rows])
+
+
+def skip_matches(puuid, matchlist):
+    """Remove matches that can't be hydrated from the ones of the summoner"""
+    Participant.objects.filter(
+        puuid=puuid, match_id__in=matchlist, hydrated=False
+    ).delete()
+
+
+def get_matches_json(matchlist):
+    """Match json of every match in the list that is already in database"""
+    return dict(
+        Match.objects.filter(match_id__in=matchlist, hydrated=True).values_list(
+            "match_id", "match_json"
         )
-        match_object.match_json = match
-        bulk_save_summary_list.append(match_object)
-    Match.objects.bulk_update(bulk_save_summary_list, ["match_json"])
+    )
+
+
+def save_matches_to_db(match_json_list):
+    """Save matches to database, once for every summoner who played them"""
+    Match.objects.bulk_create(
+        [
+            Match(
+                match_id=match_json["metadata"]["matchId"],
+                match_json=match_json,
+                card=get_match_card(match_json),
+                hydrated=True,
+                **get_match_fields(match_json),
+            )
+            for match_json in match_json_list
+        ],
+        update_conflicts=True,
+        unique_fields=["match_id"],
+        update_fields=["match_json", "card", "hydrated", *MATCH_FIELDS],
+    )
+    metrics.add("matches_ingested_total", len(match_json_list))
+
+
+def save_player_summaries_to_db(player_summary_list):
+    """Save the card and stats of every player summary, the summary itself is in the match json"""
+    Participant.objects.bulk_create(
+        [
+            Participant(
+                match_id=player_summary["matchId"],
+                puuid=player_summary["puuid"],
+                card=get_participant_card(player_summary),
+                hydrated=True,
+                **get_participant_fields(player_summary),
+            )
+            for player_summary in player_summary_list
+        ],
+        update_conflicts=True,
+        unique_fields=["match", "puuid"],
+        update_fields=["card", "hydrated", *PARTICIPANT_FIELDS],
+    )
+    metrics.add("participants_ingested_total", len(player_summary_list))
 
 
-def save_player_summaries_to_db(player_summary_list, summoner_name):
-    """Save player summaries to database"""
-    bulk_save_summary_list = []
-    for player_summary in player_summary_list:
-        match_object = Match.objects.get(
-            match_id=player_summary["matchId"], summoner=summoner_name
+def get_feed_page(puuid, before=None, size=10):
+    """Page of the summoner's match cards, newest first, without the match and summary json
+
+    Keyset pagination: the page starts after the cursor of the last card of the
+    previous page instead of counting the rows before it.
+
+    Args:
+        puuid       (string)
+        before      (string)    Cursor of the previous page, e.g: 1669049720000_EUW1_6154384371
+        size        (int)       Number of cards
+
+    Returns:
+        Tuple with the list of participants and the cursor of the next page, None if it's the last
+
+    Raises:
+        ValueError if the cursor isn't valid
+    """
+
+    participants = (
+        Participant.objects.filter(puuid=puuid, hydrated=True)
+        # 0 is custom matches; 2000, 2010 and 2020 are tutorial matches
+        .exclude(match__queue_id__in=[0, 2000, 2010, 2020])
+        .select_related("match")
+        .only("match_id", "puuid", "game_creation", "card", "match__card")
+        .order_by("-game_creation", "-match_id")
+    )
+
+    if before:
+        game_creation, match_id = before.split("_", 1)
+        game_creation = int(game_creation)
+        participants = participants.filter(
+            Q(game_creation__lt=game_creation)
+            | Q(game_creation=game_creation, match_id__lt=match_id)
         )
-        match_object.summoner_json = player_summary
-        bulk_save_summary_list.append(match_object)
-    Match.objects.bulk_update(bulk_save_summary_list, ["summoner_json"])
+
+    participants = list(participants[: size + 1])
+    if len(participants) <= size:
+        return participants, None
+
+    participants = participants[:size]
+    last = participants[-1]
+    return participants, str(last.game_creation) + "_" + last.match_id
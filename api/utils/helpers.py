@@ -3,40 +3,23 @@ Functions that performs part of the computation of another function, usually fro
 because the functionality is needed in multiple places.
 """
 
+from api.utils import static_data
 from datetime import datetime
-from requests import get
-from decouple import config
-from time import sleep
-
-API_KEY = config("API")
-
-
-def get_response(url):
-    """Get response from url"""
-    max_attempts = 3
-    attempts = 0
-    while attempts < max_attempts:
-        response = get(url)
-        if response.status_code == 200:
-            return response
-        elif response.status_code == 429:
-            print(
-                "Rate limit exceeded, sleeping for "
-                + response.headers["Retry-After"]
-                + " seconds"
-            )
-            sleep(int(response.headers["Retry-After"]))
-        attempts += 1
-    if attempts >= max_attempts:
-        raise Exception("Failed: Maxed out attempts")
-
 
-def get_participant_number(match, puuid):
-    """ind summoner participant number in the match"""
-    participant_number = 0
-    while match["metadata"]["participants"][participant_number] != puuid:
-        participant_number += 1
-    return participant_number
+# Region of each platform, the servers summoners can be looked up on
+REGIONS = {
+    "NA1": "AMERICAS",
+    "BR1": "AMERICAS",
+    "LA1": "AMERICAS",
+    "LA2": "AMERICAS",
+    "OC1": "AMERICAS",
+    "EUN1": "EUROPE",
+    "EUW1": "EUROPE",
+    "TR1": "EUROPE",
+    "RU": "EUROPE",
+    "KR": "ASIA",
+    "JP1": "ASIA",
+}
 
 
 def get_preview_stats(player_summary, game_duration):
@@ -90,76 +73,26 @@ def get_region_by_platform(platform):
     The AMERICAS routing value serves NA, BR, LAN, LAS, and OCE.
     The ASIA routing value serves KR and JP.
     The EUROPE routing value serves EUNE, EUW, TR, and RU.
+    None for an unknown platform.
     """
-    if platform in ("NA1", "BR1", "LA1", "LA2", "OC1"):
-        region = "AMERICAS"
-
-    elif platform in ("EUN1", "EUW1", "TR1", "RU"):
-        region = "EUROPE"
-
-    elif platform in ("KR", "JP1"):
-        region = "ASIA"
-
-    return region
+    return REGIONS.get(platform)
 
 
 def get_match_mode(queue_id):
     """Get match mode by the queue_id"""
-    match queue_id:
-        case 400:
-            return "Normal Draft"
-        case 420:
-            return "Ranked Solo"
-        case 430:
-            return "Normal Blind"
-        case _:
-            return "Special"
+    return static_data.get_queue(queue_id)
 
 
 def get_summoner_spell(summoner_key):
     """Get summoner spell by the summoner_key"""
-    match summoner_key:
-        case 1:
-            return "summoner_boost"
-        case 3:
-            return "summoner_exhaust"
-        case 4:
-            return "summoner_flash"
-        case 6:
-            return "summoner_haste"
-        case 7:
-            return "summoner_heal"
-        case 11:
-            return "summoner_smite"
-        case 12:
-            return "summoner_teleport"
-        case 13:
-            return "summonermana"
-        case 14:
-            return "summonerignite"
-        case 21:
-            return "summonerbarrier"
-        case 32:
-            return "summoner_mark"
-        case _:
-            return "summoner_empty"
-
-
-def get_rune_primary(rune_id, perks_json):
-    rune_dict = next((item for item in perks_json if item["id"] == rune_id), None)
-    return rune_dict["iconPath"].split("Styles/", 1)[1]
+    return static_data.get_spell(summoner_key)
+
+
+def get_rune_primary(rune_id):
+    """Get rune icon path by the rune_id"""
+    return static_data.get_perk(rune_id)
 
 
 def get_rune_secondary(rune_id):
-    """Get rune by the rune_id"""
-    match rune_id:
-        case 8000:
-            return "7201_precision"
-        case 8100:
-            return "7200_domination"
-        case 8200:
-            return "7202_sorcery"
-        case 8300:
-            return "7203_whimsy"
-        case _:
-            return "7204_resolve"
+    """Get rune style by the rune_id"""
+    return static_data.get_style(rune_id)
@@ -1,19 +1,25 @@
 """
 Contains functions that interacts with RIOT's API.
 """
-from api.utils import helpers, sessions
-from api.models import Match
+from api.utils import (
+    databases,
+    helpers,
+    leagues,
+    metrics,
+    riot,
+    singleflight,
+    static_data,
+)
 from asgiref.sync import sync_to_async
 from datetime import timedelta
-from decouple import config
-from aiohttp import ClientSession
-from asyncio import ensure_future, gather, run, sleep
+from django.conf import settings
+from asyncio import Semaphore, as_completed, ensure_future, gather
+import logging
 
+logger = logging.getLogger(__name__)
 
-API_KEY = config("API")
 
-
-def get_summoner(server, summoner_name):
+async def get_summoner(server, summoner_name):
     """Request:
     https://SERVER.api.riotgames.com/lol/summoner/v4/summoners/by-name/SUMMONER_NAME
 
@@ -31,30 +37,23 @@ def get_summoner(server, summoner_name):
             summonerLevel 	(long)
     """
 
-    url = (
-        "https://"
-        + server
-        + ".api.riotgames.com/lol/summoner/v4/summoners/by-name/"
-        + summoner_name
-        + "?api_key="
-        + API_KEY
-    )
-    response = helpers.get_response(url)
-    summoner_json = response.json()
-    summoner_json["success"] = response.status_code == 200
+    url = riot.url(server, "/lol/summoner/v4/summoners/by-name/" + summoner_name)
+    response = await riot.get(url, "summoner-v4.by-name")
+    summoner_json = await response.json()
+    summoner_json["success"] = response.status == 200
     return summoner_json
 
 
-def get_summoner_league(request, server, summoner_name):
+async def get_summoner_league(server, summoner_json):
     """Request:
     https://SERVER.api.riotgames.com/lol/league/v4/entries/by-summoner/SUMMONER_ID
 
     Args:
         server              (string)    Player's region
-        summoner_name       (string)    Summoner name
+        summoner_json       (dict)      Summoner returned by get_summoner
 
     Returns:
-        List of two dictionaries with:
+        Dictionary with the solo and flex leagues, each with:
             leagueId 	    (string)
             summonerId 	    (string) 	Player's encrypted summonerId.
             summonerName 	(string)
@@ -66,25 +65,16 @@ def get_summoner_league(request, server, summoner_name):
             losses 	        (int) 	    Losing team on Summoners Rift.
     """
 
-    summoner_json = sessions.load_summoner(request, server, summoner_name)
-
     if summoner_json["success"]:
 
-        url = (
-            "https://"
-            + server
-            + ".api.riotgames.com/lol/league/v4/entries/by-summoner/"
-            + summoner_json["id"]
-            + "?api_key="
-            + API_KEY
-        )
-        # This json is a list of dictionaries
-        summoner_league_list = helpers.get_response(url).json()
+        # This json is a list of dictionaries, shared with other requests
+        summoner_league_list = await leagues.get_entries(server, summoner_json["id"])
         # Set default values for each league
         solo = {"tier": "Unranked"}
         flex = {"tier": "Unranked"}
 
         for queue in summoner_league_list:
+            queue = dict(queue)
             queue["win_rate"] = round(
                 (queue["wins"] / (queue["wins"] + queue["losses"])) * 100
             )
@@ -99,135 +89,163 @@ def get_summoner_league(request, server, summoner_name):
     else:
         summoner_league_json = {}
 
-    return summoner_json, summoner_league_json
+    return summoner_league_json
 
 
-def get_matchlist(server, puuid):
+async def get_matchlist(server, puuid, start=0, count=100, start_time=None):
     """Request:
     https://SERVER.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids
 
     Args:
         server              (string)    Player's region
-        puuid          (string)
+        puuid               (string)
+        start               (int)       Index of the first match, 0 is the newest
+        count               (int)       Number of match ids, up to 100
+        start_time          (int)       Only matches played since this epoch timestamp in seconds
 
     Returns:
-        List with match ids
+        List with match ids, newest first
     """
 
     server = helpers.get_region_by_platform(server)
 
-    url = (
-        "https://"
-        + server
-        + ".api.riotgames.com/lol/match/v5/matches/by-puuid/"
-        + puuid
-        + "/ids?start=0&count=100&api_key="
-        + API_KEY
-    )
+    query = "?start=" + str(start) + "&count=" + str(count)
+    if start_time is not None:
+        query += "&startTime=" + str(start_time)
 
-    matchlist = helpers.get_response(url).json()
+    url = riot.url(server, "/lol/match/v5/matches/by-puuid/" + puuid + "/ids" + query)
+
+    response = await riot.get(url, "match-v5.by-puuid")
+    if response.status != 200:
+        raise riot.RiotError("Matchlist not found", response.status)
+    matchlist = await response.json()
 
     return matchlist
 
 
-async def get_match_json_list(matches):
-    """Async http request for getting match json and organizing the players data"""
+async def stream_matches(matches):
+    """Async generator of the match jsons, each one as soon as it's read or fetched
+
+    Matches already fetched for another summoner are read in a single query, the
+    others are fetched with at most MATCH_FETCH_CONCURRENCY requests at a time.
+    A match Riot doesn't find (404) is logged and yielded without json, any
+    other error stops the stream.
+
+    Yields:
+        Tuple with the match id, its json or None and whether it's saved in database
+    """
+
+    matches_in_database = await sync_to_async(databases.get_matches_json)(matches)
+    missing = [match for match in matches if match not in matches_in_database]
+    for result, count in (("hit", len(matches_in_database)), ("miss", len(missing))):
+        metrics.add("cache_requests_total", count, cache="match_db", result=result)
+
+    for match, match_json in matches_in_database.items():
+        yield match, match_json, True
+    del matches_in_database
 
-    platform = (matches[0].split("_"))[0]
+    if not missing:
+        return
+
+    platform = (missing[0].split("_"))[0]
     region = helpers.get_region_by_platform(platform)
+    semaphore = Semaphore(settings.MATCH_FETCH_CONCURRENCY)
 
-    async with ClientSession() as session:
-        tasks = []
-
-        for match in matches:
-            url = (
-                "https://"
-                + region
-                + ".api.riotgames.com/lol/match/v5/matches/"
-                + match
-                + "?api_key="
-                + API_KEY
-            )
-            tasks.append(ensure_future(get_match_json(session, url, match)))
+    async def fetch(match):
+        async with semaphore:
+            url = riot.url(region, "/lol/match/v5/matches/" + match)
+            try:
+                # Summoners of the same match being synced at the same time share the call
+                return match, *await singleflight.do(
+                    "match:" + match, load_match_json, match, url
+                )
+            except riot.RiotError as error:
+                # Any other error, e.g: a 403 of an expired key, fails the sync
+                if error.status != 404:
+                    raise
+                logger.warning("Match %s can't be fetched: %s", match, error)
+                return match, None, False
+
+    tasks = [ensure_future(fetch(match)) for match in missing]
+    try:
+        for task in as_completed(tasks):
+            yield await task
+    finally:
+        # The consumer stopped early, e.g: it failed to save a batch
+        for task in tasks:
+            task.cancel()
+
+
+async def load_match_json(match_id, url):
+    """Match json saved by a previous holder of the match's lock, or fetched
+
+    Returns:
+        Tuple with the match json and whether it's saved in database
+    """
+
+    saved = await sync_to_async(databases.get_matches_json)([match_id])
+    if match_id in saved:
+        return saved[match_id], True
 
-        return await gather(*tasks)
+    match_json = await get_match_json(url)
 
+    # Other processes look for it in database once they hold the lock
+    if settings.SINGLE_FLIGHT_LOCK:
+        await sync_to_async(databases.save_matches_to_db)([match_json])
+        return match_json, True
+    return match_json, False
 
-async def get_match_json(session, url, match):
+
+async def get_match_json(url):
     """Async to get the json from the request"""
 
-    max_attempts = 3
-    attempts = 0
-    while attempts < max_attempts:
-        # Search for match json in database
-        matches = await sync_to_async(list)(
-            Match.objects.filter(match_id=match).exclude(match_json__exact={})
-        )
-        if matches:
-            return matches[0].match_json
-        else:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    match = await response.json()
-                    # 0 is custom matches; 2000, 2010 and 2020 are tutorial matches
-                    if match["info"]["queueId"] not in {0, 2000, 2010, 2020}:
-
-                        # Get the date of match creation
-                        match["date"] = helpers.get_date_by_timestamp(
-                            match["info"]["gameCreation"]
-                        )
-
-                        # Get patch for assets, 11.23.409.111 -> 11.23.1
-                        patch = (
-                            ".".join(match["info"]["gameVersion"].split(".")[:2]) + ".1"
-                        )
-                        match["patch"] = patch
-                        if match["info"]["gameMode"] == "CLASSIC":
-                            match["match_mode"] = helpers.get_match_mode(
-                                match["info"]["queueId"]
-                            )
-                        else:
-                            match["match_mode"] = match["info"]["gameMode"]
-
-                        match["info"]["matchups"] = []
-                        for i in range(0, 5):
-                            match["info"]["matchups"].append(
-                                [
-                                    match["info"]["participants"][i],
-                                    match["info"]["participants"][i + 5],
-                                ]
-                            )
-                    return match
-
-                elif response.status == 429:
-                    print(
-                        "Rate limit exceeded, sleeping for "
-                        + response.headers["Retry-After"]
-                        + " seconds"
-                    )
-                    await sleep(int(response.headers["Retry-After"]))
-                attempts += 1
-
-    if attempts >= max_attempts:
-        raise Exception("Failed: Maxed out attempts")
-
-
-async def get_player_summary_list(matches, puuid, perks_json):
-    """Async to get a list of players summaries from match list"""
-    tasks = []
+    response = await riot.get(url, "match-v5.by-id")
+    if response.status != 200:
+        raise riot.RiotError("Match not found", response.status)
+
+    match = await response.json()
+    # 0 is custom matches; 2000, 2010 and 2020 are tutorial matches
+    if match["info"]["queueId"] not in {0, 2000, 2010, 2020}:
+
+        # Get the date of match creation
+        match["date"] = helpers.get_date_by_timestamp(match["info"]["gameCreation"])
 
-    for match in matches:
-        tasks.append(ensure_future(get_player_summary(match, puuid, perks_json)))
+        # Get patch for assets, 11.23.409.111 -> 11.23.1
+        patch = ".".join(match["info"]["gameVersion"].split(".")[:2]) + ".1"
+        match["patch"] = patch
+        # Queue names, the first match of a new box has nothing loaded yet
+        await static_data.load(patch)
+        if match["info"]["gameMode"] == "CLASSIC":
+            match["match_mode"] = helpers.get_match_mode(match["info"]["queueId"])
+        else:
+            match["match_mode"] = match["info"]["gameMode"]
+
+        match["info"]["matchups"] = []
+        for i in range(0, 5):
+            match["info"]["matchups"].append(
+                [
+                    match["info"]["participants"][i],
+                    match["info"]["participants"][i + 5],
+                ]
+            )
+    return match
 
-    return await gather(*tasks)
 
+def get_player_summaries(match):
+    """Summaries of the ten players of the match, so their profiles don't process it again"""
+    return [
+        get_player_summary(match, participant)
+        for participant in match["info"]["participants"]
+    ]
 
-async def get_player_summary(match, puuid, perks_json):
-    """Async to organize the players data"""
 
-    participant_number = helpers.get_participant_number(match, puuid)
+def get_player_summary(match, participant):
+    """Organize the data of a player of the match"""
 
-    player_summary = match["info"]["participants"][participant_number]
+    # The match json is saved as Riot sent it
+    player_summary = dict(participant)
+    if "challenges" in participant:
+        player_summary["challenges"] = dict(participant["challenges"])
 
     try:
         player_summary["kda"] = round(
@@ -247,7 +265,7 @@ async def get_player_summary(match, puuid, perks_json):
     )
 
     player_summary["rune_primary"] = helpers.get_rune_primary(
-        player_summary["perks"]["styles"][0]["selections"][0]["perk"], perks_json
+        player_summary["perks"]["styles"][0]["selections"][0]["perk"]
     )
     player_summary["rune_secondary"] = helpers.get_rune_secondary(
         player_summary["perks"]["styles"][1]["style"]
@@ -270,6 +288,7 @@ async def get_player_summary(match, puuid, perks_json):
     player_summary["matchId"] = match["metadata"]["matchId"]
     player_summary["gameMode"] = match["info"]["gameMode"]
     player_summary["gameDuration"] = int(round(match["info"]["gameDuration"] / 60, 0))
+    player_summary["gameCreationTimestamp"] = match["info"]["gameCreation"]
     player_summary["gameCreation"] = helpers.get_date_by_timestamp(
         match["info"]["gameCreation"]
     )
@@ -277,7 +296,7 @@ async def get_player_summary(match, puuid, perks_json):
     return player_summary
 
 
-def match_summary(server, match_json):
+async def match_summary(server, match_json):
     """Request: https://SERVER.api.riotgames.com/lol/match/v4/matches/GAME_ID
 
     Args:
@@ -316,7 +335,7 @@ def match_summary(server, match_json):
 
     # Get new match_json with the rank of each player. An API
     # call is needed for each player so asyncio was used.
-    match_json = run(get_players_ranks(server, match_json, summoner_id_list))
+    match_json = await get_players_ranks(server, match_json, summoner_id_list)
 
     return match_json
 
@@ -324,78 +343,56 @@ def match_summary(server, match_json):
 async def get_players_ranks(server, match_json, summoner_id_list):
     """Async to get each player's rank from the match"""
 
-    async with ClientSession() as session:
-        tasks = []
-        for summoner_id in summoner_id_list:
-            url = (
-                "https://"
-                + server
-                + ".api.riotgames.com/lol/league/v4/entries/by-summoner/"
-                + summoner_id
-                + "?api_key="
-                + API_KEY
-            )
-            tasks.append(ensure_future(get_leagues_json(session, url)))
-
-        summoners_leagues_list = await gather(*tasks)
-        current_player = 0
-        for leagues in summoners_leagues_list:
-            try:
-                # If it's a flex match, search for flex rank
-                if match_json["queueId"] == 440:
-                    leagues = next(
-                        item
-                        for item in leagues
-                        if item["queueType"] == "RANKED_FLEX_SR"
-                    )
-                else:
-                    leagues = next(
-                        item
-                        for item in leagues
-                        if item["queueType"] == "RANKED_SOLO_5x5"
-                    )
-
-            # If the player doesn't have rank, set tier to Unranked
-            except StopIteration:
-                leagues = {
-                    "tier": "Unranked",
-                    "rank": None,
-                }
-
-            # If the player doesn't have rank, display Unranked
-            if leagues["rank"] is None:
-                match_json["participants"][current_player][
-                    "tier"
-                ] = f"{leagues['tier']}"
-
+    tasks = []
+    for summoner_id in summoner_id_list:
+        tasks.append(ensure_future(leagues.get_entries(server, summoner_id)))
+
+    summoners_leagues_list = await gather(*tasks, return_exceptions=True)
+    current_player = 0
+    for summoner_leagues in summoners_leagues_list:
+        # Riot is unavailable, the match is shown without this rank and isn't cached
+        if isinstance(summoner_leagues, riot.RiotUnavailable):
+            match_json["ranks_missing"] = True
+            match_json["participants"][current_player]["tier"] = "Unknown"
+            current_player += 1
+            continue
+        if isinstance(summoner_leagues, BaseException):
+            raise summoner_leagues
+
+        try:
+            # If it's a flex match, search for flex rank
+            if match_json["queueId"] == 440:
+                summoner_leagues = next(
+                    item
+                    for item in summoner_leagues
+                    if item["queueType"] == "RANKED_FLEX_SR"
+                )
             else:
-                match_json["participants"][current_player][
-                    "tier"
-                ] = f"{leagues['tier']} {leagues['rank']}"
+                summoner_leagues = next(
+                    item
+                    for item in summoner_leagues
+                    if item["queueType"] == "RANKED_SOLO_5x5"
+                )
 
-            current_player += 1
+        # If the player doesn't have rank, set tier to Unranked
+        except StopIteration:
+            summoner_leagues = {
+                "tier": "Unranked",
+                "rank": None,
+            }
 
-    return match_json
+        # If the player doesn't have rank, display Unranked
+        if summoner_leagues["rank"] is None:
+            match_json["participants"][current_player][
+                "tier"
+            ] = f"{summoner_leagues['tier']}"
 
+        else:
+            match_json["participants"][current_player][
+                "tier"
+            ] = f"{summoner_leagues['tier']} {summoner_leagues['rank']}"
 
-async def get_leagues_json(session, url):
-    """Async to get the json from the request"""
+        current_player += 1
 
-    max_attempts = 3
-    attempts = 0
-    while attempts < max_attempts:
-        async with session.get(url) as response:
-            if response.status == 200:
-                return await response.json()
-
-            elif response.status == 429:
-                print(
-                    "Rate limit exceeded, sleeping for "
-                    + response.headers["Retry-After"]
-                    + "seconds"
-                )
-                await sleep(int(response.headers["Retry-After"]))
-            attempts += 1
+    return match_json
 
-    if attempts >= max_attempts:
-        raise Exception("Failed: Maxed out attempts")
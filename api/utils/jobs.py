@@ -0,0 +1,134 @@
+"""
+Functions that manage the queue of summoner syncs run in background by the run_worker command.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import SyncJob
+from api.utils import breaker, helpers, singleflight
+
+
+async def get_latest_job(server, summoner_name):
+    """Last sync job of the summoner, None if it was never synced"""
+    return await (
+        SyncJob.objects.filter(server=server, summoner_name=summoner_name)
+        .order_by("-created")
+        .afirst()
+    )
+
+
+async def enqueue_sync(server, summoner_name, summoner_db=None):
+    """Queue a sync of the summoner unless one is pending or it was synced recently
+
+    Returns:
+        The queued or running job of the summoner, None if its data is up to date
+    """
+
+    # Simultaneous visits of a profile queue a single job
+    return await singleflight.do(
+        "enqueue:" + server + ":" + summoner_name,
+        create_job,
+        server,
+        summoner_name,
+        summoner_db,
+    )
+
+
+async def create_job(server, summoner_name, summoner_db):
+    """Body of enqueue_sync, run once at a time for a summoner"""
+
+    job = await get_latest_job(server, summoner_name)
+    if job is not None and job.status in (SyncJob.QUEUED, SyncJob.RUNNING):
+        return job
+
+    recently = timezone.now() - timedelta(seconds=settings.SYNC_INTERVAL)
+    if summoner_db is not None and summoner_db.synced_at is not None:
+        if summoner_db.synced_at > recently:
+            return None
+    # Don't look up a summoner that wasn't found again on every visit
+    elif job is not None and job.status == SyncJob.FAILED and job.updated > recently:
+        return None
+
+    return await SyncJob.objects.acreate(server=server, summoner_name=summoner_name)
+
+
+def get_unavailable_servers():
+    """Platforms whose calls, or their region's, fail at once, see breaker.py"""
+    unavailable = breaker.get_open()
+    return [
+        platform
+        for platform, region in helpers.REGIONS.items()
+        if platform.lower() in unavailable or region.lower() in unavailable
+    ]
+
+
+async def claim_job():
+    """Take the oldest queued job, jobs of a worker that died are taken again
+
+    Jobs put back in the queue wait for their not_before time, and the jobs of
+    the servers Riot is unavailable for wait for its breaker to close.
+
+    Returns:
+        The job, now running, or None if the queue is empty
+    """
+
+    now = timezone.now()
+    timed_out = now - timedelta(seconds=settings.SYNC_JOB_TIMEOUT)
+    claimable = (
+        Q(status=SyncJob.QUEUED)
+        & (Q(not_before__isnull=True) | Q(not_before__lte=now))
+        | Q(status=SyncJob.RUNNING, updated__lt=timed_out)
+    ) & ~Q(server__in=get_unavailable_servers())
+
+    async for job in SyncJob.objects.filter(claimable).order_by("created")[:10]:
+        # Another worker may claim the same job, only one of the updates matches
+        claimed = (
+            await SyncJob.objects.filter(claimable, pk=job.pk).aupdate(
+                status=SyncJob.RUNNING, updated=timezone.now()
+            )
+            == 1
+        )
+        if claimed:
+            await job.arefresh_from_db()
+            return job
+    return None
+
+
+async def update_progress(job, matches_done, matches_total=None):
+    """Save how many matches of the job are hydrated"""
+    job.matches_done = matches_done
+    if matches_total is not None:
+        job.matches_total = matches_total
+    await job.asave(update_fields=["matches_done", "matches_total", "updated"])
+
+
+async def requeue_job(job, error):
+    """Put the job back in the queue for a cooldown, e.g: Riot is unavailable
+
+    The job fails after SYNC_MAX_ATTEMPTS, so a server that never answers
+    doesn't keep it in the queue.
+    """
+
+    job.attempts += 1
+    if job.attempts >= settings.SYNC_MAX_ATTEMPTS:
+        await job.asave(update_fields=["attempts"])
+        await finish_job(job, error)
+        return
+
+    job.status = SyncJob.QUEUED
+    job.error = error[:200]
+    job.not_before = timezone.now() + timedelta(seconds=settings.RIOT_BREAKER_COOLDOWN)
+    await job.asave(
+        update_fields=["status", "error", "attempts", "not_before", "updated"]
+    )
+
+
+async def finish_job(job, error=""):
+    """Mark the job as done, or as failed if there is an error"""
+    job.status = SyncJob.FAILED if error else SyncJob.DONE
+    job.error = error[:200]
+    await job.asave(update_fields=["status", "error", "updated"])
@@ -0,0 +1,108 @@
+"""
+Process-wide cache of the league entries of summoners, shared by every request.
+
+A match expansion needs the leagues of its ten players, and premades are in
+many matches together, so entries are kept for LEAGUE_CACHE_TTL seconds. For
+LEAGUE_CACHE_STALE seconds after that they are still served while they are
+fetched again in background.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from functools import partial
+
+from api.utils import metrics, riot, singleflight
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# (platform, summonerId) -> (time fetched, entries), least recently used first
+_entries = OrderedDict()
+# (platform, summonerId) -> task refreshing stale entries, nobody awaits it
+_refreshing = {}
+
+
+async def fetch_entries(platform, summoner_id):
+    """Request:
+    https://PLATFORM.api.riotgames.com/lol/league/v4/entries/by-summoner/SUMMONER_ID
+
+    Returns:
+        List with the summoner's league entries, one per ranked queue
+    """
+
+    url = riot.url(platform, "/lol/league/v4/entries/by-summoner/" + summoner_id)
+
+    response = await riot.get(url, "league-v4.by-summoner")
+    if response.status != 200:
+        raise riot.RiotError("Summoner not found", response.status)
+    return await response.json()
+
+
+def store(key, entries):
+    """Save the entries, dropping the least recently used ones over LEAGUE_CACHE_SIZE"""
+    _entries[key] = (time.monotonic(), entries)
+    _entries.move_to_end(key)
+    while len(_entries) > settings.LEAGUE_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+async def refresh(key):
+    """Fetch the entries again and save them"""
+    entries = await fetch_entries(*key)
+    store(key, entries)
+    return entries
+
+
+def start_refresh(key):
+    """Task fetching the entries, a single one per summoner"""
+    # The cache is per process, so are the fetches
+    return singleflight.start("league:" + ":".join(key), refresh, key, shared=False)
+
+
+def refresh_in_background(key):
+    """Start fetching the entries, the failure of the task is logged once"""
+    task = start_refresh(key)
+    if _refreshing.get(key) is not task:
+        _refreshing[key] = task
+        task.add_done_callback(partial(finish_refresh, key))
+
+
+def finish_refresh(key, task):
+    """Done callback of a background refresh, retrieves its exception"""
+    if _refreshing.get(key) is task:
+        del _refreshing[key]
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(
+            "League entries of %s/%s weren't refreshed",
+            *key,
+            exc_info=task.exception(),
+        )
+
+
+async def get_entries(platform, summoner_id):
+    """League entries of the summoner, from the cache when possible
+
+    The list is shared with other requests, it must not be modified.
+    """
+
+    key = (platform.upper(), summoner_id)
+    cached = _entries.get(key)
+
+    if cached is not None:
+        fetched, entries = cached
+        age = time.monotonic() - fetched
+        if age < settings.LEAGUE_CACHE_TTL:
+            _entries.move_to_end(key)
+            metrics.add("cache_requests_total", cache="league", result="hit")
+            return entries
+
+        if age < settings.LEAGUE_CACHE_TTL + settings.LEAGUE_CACHE_STALE:
+            refresh_in_background(key)
+            metrics.add("cache_requests_total", cache="league", result="stale")
+            return entries
+
+    metrics.add("cache_requests_total", cache="league", result="miss")
+    # Requests for the same summoner wait for the same call
+    return await asyncio.shield(start_refresh(key))
@@ -0,0 +1,174 @@
+"""
+Counters and histograms of Riot calls, caches and ingestion, served at /metrics.
+
+Each process adds its increments up in memory and writes them to a SQLite file
+at most every METRICS_FLUSH_INTERVAL seconds, so the web and worker processes
+share the same totals, like the rate limiter's buckets. Every sample is a row
+(name, labels, value), a histogram is its _bucket, _sum and _count rows.
+"""
+
+import atexit
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Seconds of a call to Riot, which waits up to RIOT_TIMEOUT
+DURATION_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# name -> (type, help) of every family, in the order they're served
+FAMILIES = {
+    "riot_requests_total": (
+        "counter",
+        "Calls to Riot's API by endpoint, routing value and status, or error",
+    ),
+    "riot_request_duration_seconds": (
+        "histogram",
+        "Seconds of the calls to Riot's API by endpoint and routing value",
+    ),
+    "riot_ratelimit_wait_seconds_total": (
+        "counter",
+        "Seconds slept by calls waiting for the rate limits, by routing value",
+    ),
+    "riot_ratelimit_waits_total": (
+        "counter",
+        "Calls that waited for the rate limits, by routing value",
+    ),
+    "riot_retries_total": (
+        "counter",
+        "Calls to Riot's API tried again, by endpoint, routing value and reason",
+    ),
+    "riot_breaker_rejections_total": (
+        "counter",
+        "Calls failed at once by an open circuit breaker, by routing value",
+    ),
+    "cache_requests_total": (
+        "counter",
+        "Lookups of the match database, league entries and Riot cache by result",
+    ),
+    "matches_ingested_total": ("counter", "Matches fetched from Riot and saved"),
+    "participants_ingested_total": (
+        "counter",
+        "Match participants saved, the matches of synced summoners",
+    ),
+}
+
+_lock = threading.Lock()
+_pending = defaultdict(float)
+_flushed = time.monotonic()
+_local = threading.local()
+
+
+def get_connection():
+    """SQLite connection of the current thread"""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(
+            settings.METRICS_DB, timeout=10, isolation_level=None
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS samples ("
+            "name TEXT, labels TEXT, value REAL, PRIMARY KEY (name, labels))"
+        )
+        _local.connection = connection
+    return connection
+
+
+def format_labels(labels):
+    """Labels in the exposition format, e.g: endpoint="match-v5.by-id",status="200" """
+    return ",".join(
+        name
+        + '="'
+        + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        + '"'
+        for name, value in sorted(labels.items())
+    )
+
+
+def add(name, value=1, **labels):
+    """Increment a counter, e.g: add("cache_requests_total", result="hit")"""
+    with _lock:
+        _pending[(name, format_labels(labels))] += value
+    flush_later()
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    """Observe a value in a histogram of DURATION_BUCKETS by default"""
+    with _lock:
+        for bound in buckets + ["+Inf"]:
+            if bound == "+Inf" or value <= bound:
+                bucket = format_labels({**labels, "le": bound})
+                _pending[(name + "_bucket", bucket)] += 1
+        _pending[(name + "_sum", format_labels(labels))] += value
+        _pending[(name + "_count", format_labels(labels))] += 1
+    flush_later()
+
+
+def flush_later():
+    """Flush the increments if the last flush is older than METRICS_FLUSH_INTERVAL"""
+    if time.monotonic() - _flushed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """Add the increments of the process to the shared samples"""
+
+    global _flushed
+    with _lock:
+        increments = list(_pending.items())
+        _pending.clear()
+        _flushed = time.monotonic()
+    if not increments:
+        return
+
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany(
+            "INSERT INTO samples VALUES (?, ?, ?) "
+            "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+            [(name, labels, value) for (name, labels), value in increments],
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+# Commands exiting before the next flush, e.g: rebuild_rollups
+atexit.register(flush)
+
+
+def get_family(name):
+    """Family of a sample, e.g: its histogram for a name ending in _bucket, _sum or _count"""
+    for suffix in ("_bucket", "_sum", "_count"):
+        family = name.removesuffix(suffix)
+        if family != name and FAMILIES.get(family, ("",))[0] == "histogram":
+            return family
+    return name
+
+
+def export():
+    """Samples of every process, in Prometheus' text exposition format"""
+
+    flush()
+    samples = defaultdict(list)
+    for name, labels, value in get_connection().execute(
+        "SELECT name, labels, value FROM samples ORDER BY name, labels"
+    ):
+        samples[get_family(name)].append((name, labels, value))
+
+    lines = []
+    for family, (kind, description) in FAMILIES.items():
+        lines.append("# HELP " + family + " " + description)
+        lines.append("# TYPE " + family + " " + kind)
+        for name, labels, value in samples[family]:
+            lines.append(
+                name
+                + ("{" + labels + "}" if labels else "")
+                + " "
+                + (str(int(value)) if value.is_integer() else repr(value))
+            )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,205 @@
+"""
+Proactive rate limiter for RIOT's API.
+
+Riot enforces an application limit per routing value and a limit per method,
+each made of one or more windows, e.g: X-App-Rate-Limit: 20:1,100:120 means
+20 calls per second and 100 calls every two minutes. Every call reserves a
+slot in all the windows of its buckets before it is sent, and the responses'
+headers keep the quotas and counts in sync with Riot's. The buckets are kept
+in a SQLite file so every worker process shares the same budget.
+
+reserve() and update() wait up to 10 seconds for the write lock of another
+process, acquire() runs them in a thread, outside the event loop.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from api.utils import metrics
+
+_local = threading.local()
+
+
+def get_connection():
+    """SQLite connection of the current thread"""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(
+            settings.RIOT_RATE_LIMIT_DB, timeout=10, isolation_level=None
+        )
+        # Readers, e.g: the breakers shown by the views, don't wait for the writers
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT, window INTEGER, quota INTEGER, used INTEGER, reset REAL, "
+            "PRIMARY KEY (key, window))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS holds (key TEXT PRIMARY KEY, until REAL)"
+        )
+        # Circuit breakers of the routing values, see breaker.py
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS breakers "
+            "(key TEXT PRIMARY KEY, failures INTEGER, opened REAL)"
+        )
+        _local.connection = connection
+    return connection
+
+
+def parse_header(header):
+    """Windows of a rate limit header, e.g: "20:1,100:120" -> {1: 20, 120: 100}"""
+    windows = {}
+    if not header:
+        return windows
+    for pair in header.split(","):
+        value, window = pair.split(":")
+        windows[int(window)] = int(value)
+    return windows
+
+
+def get_keys(request_url, method):
+    """Application and method bucket keys of a request
+
+    Args:
+        request_url     (string)    e.g: https://euw1.api.riotgames.com/lol/... or http://127.0.0.1:8001/euw1/lol/...
+        method          (string)    Name of the endpoint, e.g: summoner-v4.by-name
+
+    Returns:
+        Tuple with the application key and the method key, e.g: ("euw1", "euw1:summoner-v4.by-name")
+    """
+
+    parts = urlsplit(request_url)
+    if parts.hostname.endswith(".api.riotgames.com"):
+        routing = parts.hostname.split(".")[0]
+    else:
+        # Local stand-in, the routing value is the first folder, see RIOT_API_URL
+        routing = parts.path.split("/")[1]
+    return routing, routing + ":" + method
+
+
+def reserve(keys):
+    """Take one slot in every window of the buckets
+
+    Returns:
+        0 if the call can be sent now, otherwise the seconds to wait before trying again
+    """
+
+    connection = get_connection()
+    now = time.time()
+    wait = 0
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        # Application buckets start with the configured limits until Riot's headers
+        # arrive, then update() replaces their windows with Riot's
+        seeded = connection.execute(
+            "SELECT 1 FROM buckets WHERE key = ? LIMIT 1", (keys[0],)
+        ).fetchone()
+        if seeded is None:
+            for window, quota in parse_header(settings.RIOT_APP_RATE_LIMIT).items():
+                connection.execute(
+                    "INSERT INTO buckets VALUES (?, ?, ?, 0, ?)",
+                    (keys[0], window, quota, now + window),
+                )
+
+        placeholders = ",".join("?" * len(keys))
+        for (until,) in connection.execute(
+            "SELECT until FROM holds WHERE key IN (" + placeholders + ")", keys
+        ):
+            wait = max(wait, until - now)
+
+        connection.execute(
+            "UPDATE buckets SET used = 0, reset = ? + window "
+            "WHERE key IN (" + placeholders + ") AND reset <= ?",
+            (now, *keys, now),
+        )
+        for used, quota, reset in connection.execute(
+            "SELECT used, quota, reset FROM buckets WHERE key IN (" + placeholders + ")",
+            keys,
+        ):
+            if used >= quota:
+                wait = max(wait, reset - now)
+
+        if wait <= 0:
+            connection.execute(
+                "UPDATE buckets SET used = used + 1 WHERE key IN (" + placeholders + ")",
+                keys,
+            )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return max(wait, 0)
+
+
+def update(keys, status, headers):
+    """Sync the buckets with the rate limit headers of a response"""
+
+    connection = get_connection()
+    now = time.time()
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for key, prefix in zip(keys, ("X-App-Rate-Limit", "X-Method-Rate-Limit")):
+            if prefix not in headers:
+                continue
+
+            quotas = parse_header(headers[prefix])
+            counts = parse_header(headers.get(prefix + "-Count", ""))
+            # Windows no longer returned by Riot are no longer enforced
+            connection.execute(
+                "DELETE FROM buckets WHERE key = ? AND window NOT IN ("
+                + ",".join("?" * len(quotas))
+                + ")",
+                (key, *quotas),
+            )
+            for window, quota in quotas.items():
+                connection.execute(
+                    "INSERT INTO buckets VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key, window) DO UPDATE SET "
+                    "quota = excluded.quota, used = MAX(used, excluded.used)",
+                    (key, window, quota, counts.get(window, 1), now + window),
+                )
+
+        if status == 429 and "Retry-After" in headers:
+            # Application limits block every method of the routing value
+            if headers.get("X-Rate-Limit-Type") == "application":
+                key = keys[0]
+            else:
+                key = keys[1]
+            connection.execute(
+                "INSERT OR REPLACE INTO holds VALUES (?, ?)",
+                (key, now + int(headers["Retry-After"])),
+            )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+async def acquire(keys, deadline=None):
+    """Wait, without blocking the event loop, until the call is allowed by every bucket
+
+    Args:
+        keys        (tuple)     Keys returned by get_keys
+        deadline    (float)     time.monotonic() after which the call is given up
+
+    Returns:
+        True once a slot is taken, False if it would be after the deadline
+    """
+    wait = await asyncio.to_thread(reserve, keys)
+    if wait:
+        metrics.add("riot_ratelimit_waits_total", routing=keys[0])
+    while wait:
+        if deadline is not None and time.monotonic() + wait > deadline:
+            return False
+        metrics.add("riot_ratelimit_wait_seconds_total", wait, routing=keys[0])
+        await asyncio.sleep(wait)
+        wait = await asyncio.to_thread(reserve, keys)
+    return True
@@ -0,0 +1,207 @@
+"""
+Long-lived HTTP client shared by every request made to RIOT's API.
+
+Connections are pooled and kept alive per regional host, so a page view reuses
+the TCP+TLS connections opened by the previous ones instead of paying a new
+handshake for each summoner, league, matchlist or match call.
+
+Calls made with get() are retried on 429, 5xx and network errors with a
+jittered exponential backoff, within the deadline of the current context, and
+fail at once while the breaker of their host is open, see breaker.py.
+
+The rate limiter and the breakers are SQLite files shared with the other
+processes, their queries run in threads so waiting for another process's
+write lock never blocks the event loop.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from weakref import WeakKeyDictionary
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
+from api.utils import breaker, metrics, ratelimit, timing
+from decouple import config
+from django.conf import settings
+
+API_KEY = config("API")
+
+# One session per event loop: under ASGI it's the worker's loop, shared by every request
+_sessions = WeakKeyDictionary()
+
+# time.monotonic() after which the calls of the current context are given up
+_deadline = ContextVar("deadline", default=None)
+
+
+class RiotError(Exception):
+    """Riot answered a call with an error that trying again won't fix, e.g: 403"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RiotUnavailable(RiotError):
+    """Riot didn't answer in time, its breaker is open or the attempts ran out"""
+
+
+def url(routing, path):
+    """Full url of an API path, e.g: url("EUW1", "/lol/summoner/v4/...")
+
+    Args:
+        routing     (string)    Platform (EUW1, NA1...) or region (EUROPE, AMERICAS...)
+        path        (string)    Path of the endpoint, including the query string
+    """
+
+    return settings.RIOT_API_URL.format(routing=routing.lower()) + path
+
+
+def get_session():
+    """aiohttp session with a keep-alive connection pool per host, for the running event loop"""
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+
+    if session is None or session.closed:
+        connector = TCPConnector(
+            limit=settings.RIOT_POOL_LIMIT,
+            limit_per_host=settings.RIOT_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.RIOT_DNS_CACHE_TTL,
+            keepalive_timeout=settings.RIOT_KEEPALIVE_TIMEOUT,
+        )
+        session = ClientSession(
+            connector=connector,
+            timeout=ClientTimeout(total=settings.RIOT_TIMEOUT),
+        )
+        _sessions[loop] = session
+    return session
+
+
+@contextmanager
+def deadline(seconds):
+    """Give up the calls made in the block after the seconds, e.g: with deadline(5):"""
+    until = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(until if current is None else min(current, until))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def get(request_url, method):
+    """GET with the retry policy: backoff, deadline and circuit breaker
+
+    Outside a deadline() block, each call has RIOT_DEADLINE seconds.
+
+    Args:
+        request_url     (string)
+        method          (string)    Name of the endpoint for its rate limit, e.g: match-v5.by-id
+
+    Returns:
+        The response, 2xx or 404: what doesn't exist won't be found by trying again
+
+    Raises:
+        RiotError for the other 4xx, RiotUnavailable once the call is given up
+    """
+
+    until = _deadline.get()
+    if until is None:
+        until = time.monotonic() + settings.RIOT_DEADLINE
+    routing = ratelimit.get_keys(request_url, method)[0]
+
+    attempt = 0
+    while True:
+        if not await asyncio.to_thread(breaker.allow, routing):
+            metrics.add("riot_breaker_rejections_total", routing=routing)
+            raise RiotUnavailable("Riot's " + routing + " breaker is open")
+
+        try:
+            response = await fetch(request_url, method, until)
+        except (ClientError, asyncio.TimeoutError) as error:
+            await asyncio.to_thread(breaker.fail, routing)
+            reason = error.__class__.__name__
+        else:
+            if response.status >= 500:
+                await asyncio.to_thread(breaker.fail, routing)
+            else:
+                await asyncio.to_thread(breaker.succeed, routing)
+            if response.status < 300 or response.status == 404:
+                return response
+            if response.status != 429 and response.status < 500:
+                raise RiotError(
+                    method + " answered " + str(response.status), response.status
+                )
+            reason = str(response.status)
+
+        attempt += 1
+        if attempt >= settings.RIOT_MAX_ATTEMPTS:
+            raise RiotUnavailable(method + " failed " + str(attempt) + " times")
+
+        # Full jitter, so the calls that failed together don't retry together
+        backoff = random.uniform(
+            0, min(settings.RIOT_BACKOFF_MAX, settings.RIOT_BACKOFF_BASE * 2**attempt)
+        )
+        if time.monotonic() + backoff >= until:
+            raise RiotUnavailable(method + " ran out of time")
+        metrics.add(
+            "riot_retries_total", endpoint=method, routing=routing, reason=reason
+        )
+        with timing.phase("backoff"):
+            await asyncio.sleep(backoff)
+
+
+async def fetch(request_url, method, until=None):
+    """A single GET through the shared pool, waiting for the rate limiter
+
+    The body is read before the connection goes back to the pool,
+    so response.json() can still be awaited by the caller.
+
+    Args:
+        request_url     (string)
+        method          (string)    Name of the endpoint for its rate limit, e.g: match-v5.by-id
+        until           (float)     Deadline of the call, from time.monotonic()
+    """
+
+    keys = ratelimit.get_keys(request_url, method)
+    with timing.phase("ratelimit"):
+        acquired = await ratelimit.acquire(keys, until)
+    if not acquired:
+        raise RiotUnavailable(method + " would wait for the rate limits too long")
+
+    timeout = settings.RIOT_TIMEOUT
+    if until is not None:
+        timeout = min(timeout, max(until - time.monotonic(), 0.1))
+
+    started = time.perf_counter()
+    try:
+        with timing.phase("riot"):
+            async with get_session().get(
+                request_url,
+                headers={"X-Riot-Token": API_KEY},
+                timeout=ClientTimeout(total=timeout),
+            ) as response:
+                await response.read()
+    except (ClientError, asyncio.TimeoutError):
+        metrics.add(
+            "riot_requests_total", endpoint=method, routing=keys[0], status="error"
+        )
+        raise
+    finally:
+        metrics.observe(
+            "riot_request_duration_seconds",
+            time.perf_counter() - started,
+            endpoint=method,
+            routing=keys[0],
+        )
+
+    metrics.add(
+        "riot_requests_total",
+        endpoint=method,
+        routing=keys[0],
+        status=response.status,
+    )
+    await asyncio.to_thread(ratelimit.update, keys, response.status, response.headers)
+    return response
@@ -0,0 +1,465 @@
+"""
+Local stand-in for RIOT's API, serving recorded responses, for offline benchmarks.
+
+Responses are read from a fixtures folder, one JSON file per url, e.g:
+    FIXTURES/euw1/lol/summoner/v4/summoners/by-name/NAME.json
+    FIXTURES/europe/lol/match/v5/matches/by-puuid/PUUID/ids@QUERY_HASH.json
+    FIXTURES/cdragon/perks.json
+Each file holds the status and the body of the response. In record mode the
+missing ones are fetched from Riot and CommunityDragon and saved, and
+generate() writes a synthetic profile of any history size. Its matchlist is a
+single file with every match, FIXTURES/europe/.../by-puuid/PUUID/ids.json,
+filtered by the start, count, startTime and endTime of each request.
+
+Every response waits the configured latency and has Riot's rate limit headers.
+Calls over the limits, and the configured ratio of the others, get a 429 with
+Retry-After. The client is pointed at the server with the settings:
+    RIOT_API_URL = http://127.0.0.1:8001/{routing}
+    CDRAGON_URL = http://127.0.0.1:8001/cdragon/
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+import zlib
+
+from aiohttp import ClientSession, web
+from decouple import config
+
+from api.utils import helpers, ratelimit
+
+# Hosts the record mode fetches from, the settings may point at this server
+RIOT_URL = "https://{routing}.api.riotgames.com"
+CDRAGON_URL = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/"
+
+MATCHLIST_PATH = re.compile(r"^/lol/match/v5/matches/by-puuid/[^/]+/ids$")
+
+
+class Limits:
+    """Calls in the windows of a rate limit, e.g: "20:1,100:120", for each key"""
+
+    def __init__(self, header):
+        self.header = header
+        self.quotas = ratelimit.parse_header(header)
+        self.windows = {}
+
+    def hit(self, key):
+        """Count a call
+
+        Returns:
+            Tuple with the count header, e.g: "1:1,1:120", and the seconds until
+            the call would be allowed, 0 if it's under every limit
+        """
+
+        now = time.monotonic()
+        counts = []
+        wait = 0
+        for window, quota in self.quotas.items():
+            count, reset = self.windows.get((key, window), (0, now + window))
+            if reset <= now:
+                count, reset = 0, now + window
+            count += 1
+            self.windows[(key, window)] = (count, reset)
+            if count > quota:
+                wait = max(wait, reset - now)
+            counts.append(str(count) + ":" + str(window))
+        return ",".join(counts), wait
+
+
+def get_fixture_path(fixtures, routing, raw_path, query):
+    """File of the response of a url, the query string is hashed"""
+    name = raw_path.strip("/")
+    if query:
+        name += "@" + hashlib.sha1(query.encode()).hexdigest()[:12]
+    return os.path.join(fixtures, routing.lower(), *name.split("/")) + ".json"
+
+
+def save_fixture(fixtures, routing, raw_path, query, status, body, **fields):
+    """Write the response of a url, with the extra fields of the stand-in"""
+    path = get_fixture_path(fixtures, routing, raw_path, query)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"status": status, "body": body, **fields}, file)
+
+
+def get_method(path):
+    """Endpoint whose method limit the call counts in, e.g: /lol/match/v5/matches"""
+    return "/".join(path.split("/")[:5])
+
+
+def error(status, message, headers=None):
+    """Response with the body of Riot's errors"""
+    return web.json_response(
+        {"status": {"message": message, "status_code": status}},
+        status=status,
+        headers=headers,
+    )
+
+
+async def record(app, routing, raw_path, query):
+    """Fetch the response from Riot or CommunityDragon"""
+
+    if routing == "cdragon":
+        url = CDRAGON_URL + raw_path.strip("/")
+        headers = {}
+    else:
+        url = RIOT_URL.format(routing=routing.lower()) + raw_path
+        headers = {"X-Riot-Token": config("API")}
+    if query:
+        url += "?" + query
+
+    async with app["session"].get(url, headers=headers) as response:
+        return response.status, await response.json(content_type=None)
+
+
+async def load(app, routing, raw_path, query):
+    """Status and body of the recorded response, recorded first in record mode"""
+
+    path = get_fixture_path(app["fixtures"], routing, raw_path, query)
+    try:
+        with open(path) as file:
+            fixture = json.load(file)
+        return fixture["status"], fixture["body"]
+    except FileNotFoundError:
+        if not app["record"]:
+            return None, None
+
+    status, body = await record(app, routing, raw_path, query)
+    # Limits and outages of the moment aren't replayed
+    if status in (200, 404):
+        save_fixture(app["fixtures"], routing, raw_path, query, status, body)
+    return status, body
+
+
+def filter_matchlist(fixture, query):
+    """Page of a generated matchlist, as Riot filters it
+
+    Args:
+        fixture     (dict)      Every match id, newest first, and their creations in "creations"
+        query       (dict)      Query of the request: start, count, startTime and endTime
+
+    Returns:
+        List with the match ids of the page
+    """
+
+    start = int(query.get("start", 0))
+    count = int(query.get("count", 20))
+    # Riot's times are in epoch seconds, the creations in milliseconds
+    start_time = int(query.get("startTime", 0)) * 1000
+    end_time = int(query["endTime"]) * 1000 if "endTime" in query else math.inf
+
+    match_ids = [
+        match_id
+        for match_id, creation in zip(fixture["body"], fixture["creations"])
+        if start_time <= creation <= end_time
+    ]
+    return match_ids[start : start + count]
+
+
+async def load_matchlist(app, routing, raw_path, query, query_string):
+    """Status and body of a matchlist request, from the generated matchlist if there is one"""
+
+    path = get_fixture_path(app["fixtures"], routing, raw_path, "")
+    try:
+        with open(path) as file:
+            fixture = json.load(file)
+    except FileNotFoundError:
+        fixture = None
+
+    if fixture is None or "creations" not in fixture:
+        # Recorded pages, one per query string
+        return await load(app, routing, raw_path, query_string)
+    return 200, filter_matchlist(fixture, query)
+
+
+async def handle(request):
+    """Any Riot or CommunityDragon url, from the fixtures"""
+
+    app = request.app
+    routing = request.match_info["routing"]
+    raw_path = request.raw_path.split("?", 1)[0][len(routing) + 1 :]
+
+    delay = app["latency"] + random.uniform(0, app["jitter"])
+    if delay:
+        await asyncio.sleep(delay)
+
+    headers = {}
+    if routing != "cdragon":
+        app["calls"] += 1
+        app_count, app_wait = app["app_limits"].hit(routing)
+        method_count, method_wait = app["method_limits"].hit(
+            routing + get_method(request.path[len(routing) + 1 :])
+        )
+        headers = {
+            "X-App-Rate-Limit": app["app_limits"].header,
+            "X-App-Rate-Limit-Count": app_count,
+            "X-Method-Rate-Limit": app["method_limits"].header,
+            "X-Method-Rate-Limit-Count": method_count,
+        }
+
+        if app_wait or method_wait:
+            headers["Retry-After"] = str(math.ceil(max(app_wait, method_wait)))
+            headers["X-Rate-Limit-Type"] = "application" if app_wait else "method"
+            return error(429, "Rate limit exceeded", headers)
+
+        if random.random() < app["error_rate"]:
+            headers["Retry-After"] = str(app["retry_after"])
+            headers["X-Rate-Limit-Type"] = "method"
+            return error(429, "Rate limit exceeded", headers)
+
+    if MATCHLIST_PATH.match(raw_path):
+        status, body = await load_matchlist(
+            app, routing, raw_path, request.query, request.query_string
+        )
+    else:
+        status, body = await load(app, routing, raw_path, request.query_string)
+    if status is None:
+        return error(404, "Data not found - no fixture recorded", headers)
+    return web.json_response(body, status=status, headers=headers)
+
+
+async def open_session(app):
+    """Client of the record mode"""
+    app["session"] = ClientSession()
+    yield
+    await app["session"].close()
+
+
+def get_participant(rng, puuid, summoner_id, champion, position, win):
+    """Participant of a synthetic match, with the fields read by the app"""
+    kills, deaths, assists = rng.randint(0, 15), rng.randint(0, 12), rng.randint(0, 20)
+    return {
+        "puuid": puuid,
+        "summonerId": summoner_id,
+        "summonerName": summoner_id,
+        "championId": champion,
+        "championName": "Champion" + str(champion),
+        "teamPosition": position,
+        "kills": kills,
+        "deaths": deaths,
+        "assists": assists,
+        "totalMinionsKilled": rng.randint(20, 250),
+        "neutralMinionsKilled": rng.randint(0, 40),
+        "visionScore": rng.randint(5, 80),
+        "goldEarned": rng.randint(6000, 18000),
+        "totalDamageDealtToChampions": rng.randint(5000, 40000),
+        "win": win,
+        "summoner1Id": 4,
+        "summoner2Id": rng.choice([3, 7, 11, 12, 14]),
+        "perks": {
+            "styles": [
+                {"style": 8000, "selections": [{"perk": 8010}]},
+                {"style": 8100, "selections": [{"perk": 8139}]},
+            ]
+        },
+        "challenges": {"killParticipation": rng.random()},
+        **{"item" + str(slot): rng.choice([0, 1055, 3031, 3006, 6672]) for slot in range(6)},
+        "item6": 3340,
+    }
+
+
+def generate(fixtures, platform, summoner_name, history, seed=0):
+    """Fixtures of a synthetic summoner with history ranked matches, and of its players' leagues
+
+    Returns:
+        List with the match ids, newest first
+    """
+
+    rng = random.Random(seed)
+    platform = platform.upper()
+    region = helpers.get_region_by_platform(platform).lower()
+    positions = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+    puuid = "puuid-" + summoner_name
+    summoner_id = "id-" + summoner_name
+    # Other players come from a pool, so premades and league lookups repeat as they do live
+    pool = ["player-" + str(number) for number in range(50)]
+
+    save_fixture(
+        fixtures,
+        platform,
+        "/lol/summoner/v4/summoners/by-name/" + summoner_name,
+        "",
+        200,
+        {
+            "id": summoner_id,
+            "puuid": puuid,
+            "name": summoner_name,
+            "profileIconId": 1,
+            "summonerLevel": 100,
+        },
+    )
+    for player_id in [summoner_id] + pool:
+        save_fixture(
+            fixtures,
+            platform,
+            "/lol/league/v4/entries/by-summoner/" + player_id,
+            "",
+            200,
+            [
+                {
+                    "queueType": "RANKED_SOLO_5x5",
+                    "tier": rng.choice(["SILVER", "GOLD", "PLATINUM"]),
+                    "rank": rng.choice(["I", "II", "III", "IV"]),
+                    "leaguePoints": rng.randint(0, 99),
+                    "wins": rng.randint(10, 200),
+                    "losses": rng.randint(10, 200),
+                }
+            ],
+        )
+
+    # Match ids of each summoner don't overlap the ones of other names
+    base = 5000000000 + zlib.crc32(summoner_name.encode()) % 1000 * 1000000
+    creation = 1700000000000
+    match_ids = []
+    for number in range(history):
+        match_id = platform + "_" + str(base - number)
+        match_ids.append(match_id)
+        players = [(puuid, summoner_id)] + [
+            ("puuid-" + player, player) for player in rng.sample(pool, 9)
+        ]
+        rng.shuffle(players)
+        participants = [
+            get_participant(
+                rng, player[0], player[1], rng.randint(1, 160), positions[i % 5], i < 5
+            )
+            for i, player in enumerate(players)
+        ]
+        save_fixture(
+            fixtures,
+            region,
+            "/lol/match/v5/matches/" + match_id,
+            "",
+            200,
+            {
+                "metadata": {
+                    "matchId": match_id,
+                    "participants": [participant["puuid"] for participant in participants],
+                },
+                "info": {
+                    "queueId": 420,
+                    "gameMode": "CLASSIC",
+                    # A match every two hours, newest first
+                    "gameCreation": creation - number * 7200000,
+                    "gameDuration": rng.randint(1200, 2400),
+                    "gameVersion": "13.1.482.1234",
+                    "platformId": platform,
+                    "participants": participants,
+                    "teams": [{"win": True}, {"win": False}],
+                },
+            },
+        )
+
+    # Every match of the summoner, each request gets the page it asks for
+    save_fixture(
+        fixtures,
+        region,
+        "/lol/match/v5/matches/by-puuid/" + puuid + "/ids",
+        "",
+        200,
+        match_ids,
+        creations=[creation - number * 7200000 for number in range(history)],
+    )
+
+    save_fixture(
+        fixtures,
+        "cdragon",
+        "/perks.json",
+        "",
+        200,
+        [
+            {"id": 8010, "iconPath": "/lol-game-data/assets/v1/perk-images/Styles/Precision/Conqueror/Conqueror.png"},
+            {"id": 8139, "iconPath": "/lol-game-data/assets/v1/perk-images/Styles/Domination/TasteOfBlood/GreenTerror_TasteOfBlood.png"},
+        ],
+    )
+    save_fixture(
+        fixtures,
+        "cdragon",
+        "/perkstyles.json",
+        "",
+        200,
+        {
+            "styles": [
+                {"id": 8000, "iconPath": "/lol-game-data/assets/v1/perk-images/Styles/7201_Precision.png"},
+                {"id": 8100, "iconPath": "/lol-game-data/assets/v1/perk-images/Styles/7200_Domination.png"},
+            ]
+        },
+    )
+    save_fixture(
+        fixtures,
+        "cdragon",
+        "/summoner-spells.json",
+        "",
+        200,
+        [
+            {"id": spell, "iconPath": "/lol-game-data/assets/DATA/Spells/Icons2D/" + icon + ".png"}
+            for spell, icon in [
+                (3, "SummonerExhaust"),
+                (4, "Summoner_Flash"),
+                (7, "SummonerHeal"),
+                (11, "Summoner_Smite"),
+                (12, "Summoner_Teleport_New"),
+                (14, "SummonerIgnite"),
+            ]
+        ],
+    )
+    save_fixture(
+        fixtures,
+        "cdragon",
+        "/queues.json",
+        "",
+        200,
+        {
+            str(queue): {"id": queue, "name": name}
+            for queue, name in [
+                (400, "Draft Pick"),
+                (420, "Ranked Solo/Duo"),
+                (430, "Blind Pick"),
+                (440, "Ranked Flex"),
+                (450, "ARAM"),
+            ]
+        },
+    )
+    return match_ids
+
+
+def get_app(
+    fixtures,
+    record=False,
+    latency=0,
+    jitter=0,
+    error_rate=0,
+    retry_after=1,
+    app_limit="20:1,100:120",
+    method_limit="2000:10",
+):
+    """Server application
+
+    Args:
+        fixtures        (string)    Folder of the recorded responses
+        record          (bool)      Fetch and save the missing responses
+        latency         (float)     Seconds every response waits
+        jitter          (float)     Random extra seconds, up to this value
+        error_rate      (float)     Ratio of calls under the limits that get a 429 anyway
+        retry_after     (int)       Retry-After seconds of those 429
+        app_limit       (string)    Application limit of each routing value, e.g: 20:1,100:120
+        method_limit    (string)    Limit of each endpoint
+    """
+
+    app = web.Application()
+    app["fixtures"] = fixtures
+    app["record"] = record
+    app["latency"] = latency
+    app["jitter"] = jitter
+    app["error_rate"] = error_rate
+    app["retry_after"] = retry_after
+    app["app_limits"] = Limits(app_limit)
+    app["method_limits"] = Limits(method_limit)
+    app["calls"] = 0  # Riot calls received, read by the benchmark command
+    app.cleanup_ctx.append(open_session)
+    app.router.add_get("/{routing}/{path:.*}", handle)
+    return app
@@ -0,0 +1,218 @@
+"""
+Champion stats of every stored match, by patch, queue, role and champion.
+
+The rollups are incremented when a match is hydrated instead of being computed
+from the participants on every request. A match is claimed by setting its
+rolled_up flag, so it's counted once however many tracked summoners played it.
+The stat buckets and champion stats of the players, see windows.py and
+champions.py, are added in the same pass.
+"""
+
+import logging
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, Sum
+
+from api.models import ChampionRollup, ChampionStat, Match, Participant, StatBucket
+from api.utils import aggregates, champions, databases, interactions, windows
+
+logger = logging.getLogger(__name__)
+
+# Totals of the rollup, incremented for each participant
+SUM_FIELDS = [
+    "matches",
+    "wins",
+    "kills",
+    "deaths",
+    "assists",
+    "minions",
+    "vision",
+    "gold",
+    "damage",
+    "duration",
+]
+KEY_FIELDS = ["patch", "queue_id", "role", "champion_id"]
+
+
+def claim(match_ids):
+    """Set the rolled_up flag of the hydrated matches that don't have it
+
+    Only one of the workers saving the same match updates the flag.
+
+    Returns:
+        List with the match ids whose flag was set
+    """
+
+    if not match_ids:
+        return []
+
+    table = connection.ops.quote_name(Match._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE "
+            + table
+            + " SET rolled_up = %s WHERE hydrated = %s AND rolled_up = %s"
+            + " AND match_id IN ("
+            + ", ".join(["%s"] * len(match_ids))
+            + ") RETURNING match_id",
+            [True, True, False, *match_ids],
+        )
+        return [match_id for (match_id,) in cursor.fetchall()]
+
+
+def add_matches(match_ids):
+    """Add the hydrated participants of the matches not counted yet to every table of totals
+
+    Returns:
+        Number of matches added
+    """
+
+    with transaction.atomic():
+        claimed = claim(list(match_ids))
+        if not claimed:
+            return 0
+
+        totals = list(
+            Participant.objects.filter(match_id__in=claimed, hydrated=True)
+            .values(
+                "champion_id",
+                patch=F("match__patch"),
+                queue_id=F("match__queue_id"),
+                role=F("team_position"),
+            )
+            .annotate(
+                champion_name=Max("champion_name"),
+                matches=Count("pk"),
+                wins=Count("pk", filter=Q(win=True)),
+                kills=Sum("kills"),
+                deaths=Sum("deaths"),
+                assists=Sum("assists"),
+                minions=Sum("minions"),
+                vision=Sum("vision"),
+                gold=Sum("gold"),
+                damage=Sum("damage"),
+                duration=Sum("match__game_duration"),
+            )
+            .order_by()
+        )
+
+        databases.increment(
+            ChampionRollup,
+            KEY_FIELDS,
+            totals,
+            SUM_FIELDS,
+            insert_fields=["champion_name"],
+        )
+
+        windows.add_matches(claimed)
+        champions.add_matches(claimed)
+
+    return len(claimed)
+
+
+def add_missing_participants(match_ids):
+    """Hydrate the participants missing from stored matches, from their match json
+
+    Matches stored before every player of a match was hydrated at ingestion
+    only have the row of the summoner who synced them, counting them would
+    leave the other players out of the totals. The static data of their
+    patches must be loaded.
+
+    Returns:
+        List with the match ids whose participants are all hydrated
+    """
+
+    hydrated = Counter(
+        Participant.objects.filter(match_id__in=match_ids, hydrated=True).values_list(
+            "match_id", flat=True
+        )
+    )
+
+    complete = []
+    player_summary_list = []
+    for match_id, match_json in Match.objects.filter(
+        match_id__in=match_ids, hydrated=True
+    ).values_list("match_id", "match_json"):
+        try:
+            if hydrated[match_id] < len(match_json["info"]["participants"]):
+                player_summary_list += interactions.get_player_summaries(match_json)
+        except (KeyError, IndexError, TypeError, ValueError):
+            logger.exception("Match %s can't be summarized", match_id)
+            continue
+        complete.append(match_id)
+
+    databases.save_player_summaries_to_db(player_summary_list)
+    return complete
+
+
+def reset():
+    """Empty the tables of totals, every hydrated match is added again by add_matches"""
+    with transaction.atomic():
+        ChampionRollup.objects.all().delete()
+        StatBucket.objects.all().delete()
+        ChampionStat.objects.all().delete()
+        Match.objects.filter(rolled_up=True).update(rolled_up=False)
+
+
+def get_patches(queue_id):
+    """Patches with rollups of the queue, newest first"""
+    patches = (
+        ChampionRollup.objects.filter(queue_id=queue_id)
+        .values_list("patch", flat=True)
+        .distinct()
+    )
+    return sorted(
+        patches,
+        key=lambda patch: [int(part) for part in patch.split(".") if part.isdigit()],
+        reverse=True,
+    )
+
+
+def get_tier_list(patch, queue_id, role=None):
+    """Champion stats of a patch and queue, most played first
+
+    Args:
+        patch       (string)    e.g: 13.1.1
+        queue_id    (int)       e.g: 420
+        role        (string)    teamPosition, e.g: MIDDLE; every role by default
+
+    Returns:
+        Dictionary with the number of matches and the list of champions
+    """
+
+    rollups = ChampionRollup.objects.filter(patch=patch, queue_id=queue_id)
+    # Ten participants per match
+    matches = (rollups.aggregate(total=Sum("matches"))["total"] or 0) // 10
+    if role:
+        rollups = rollups.filter(role=role.upper())
+
+    champion_list = []
+    for rollup in rollups.order_by("-matches", "champion_id"):
+        minutes = rollup.duration / 60
+        champion_list.append(
+            {
+                "champion_id": rollup.champion_id,
+                "champion_name": rollup.champion_name,
+                "role": rollup.role.lower(),
+                "matches": rollup.matches,
+                "wins": rollup.wins,
+                "win_rate": aggregates.divide(rollup.wins * 100, rollup.matches),
+                "pick_rate": aggregates.divide(rollup.matches * 100, matches),
+                "kda": aggregates.get_kda(rollup.kills, rollup.deaths, rollup.assists),
+                "kills": aggregates.divide(rollup.kills, rollup.matches),
+                "deaths": aggregates.divide(rollup.deaths, rollup.matches),
+                "assists": aggregates.divide(rollup.assists, rollup.matches),
+                "cs_per_min": aggregates.divide(rollup.minions, minutes),
+                "vision_per_min": aggregates.divide(rollup.vision, minutes),
+                "gold_per_min": aggregates.divide(rollup.gold, minutes),
+                "damage_per_min": aggregates.divide(rollup.damage, minutes),
+            }
+        )
+
+    return {
+        "patch": patch,
+        "queue_id": queue_id,
+        "matches": matches,
+        "champions": champion_list,
+    }
@@ -0,0 +1,121 @@
+"""
+Coalescing of concurrent calls doing the same work, e.g: fetching the same match.
+
+Callers of the same key in a process await a single task and share its result.
+With SINGLE_FLIGHT_LOCK set to "file" or "db", the task also holds a lock
+shared with the other processes, so they run the same key one at a time;
+the operation must then look for the result of the previous holder first.
+"""
+
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from api.models import FlightLock
+
+# Key -> task running it
+_flights = {}
+
+
+def start(key, function, *args, shared=True):
+    """Task running function(*args), the same one for every caller of the key
+
+    Args:
+        key         (string)    Identity of the work, e.g: match:EUW1_6154384371
+        shared      (bool)      Hold the lock of the key shared with other processes
+    """
+
+    task = _flights.get(key)
+    # A task of a finished event loop can't be awaited
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = _flights[key] = asyncio.ensure_future(run(key, function, args, shared))
+    return task
+
+
+async def do(key, function, *args, shared=True):
+    """Await function(*args), or the call already running for the key"""
+    # A cancelled caller doesn't cancel the work of the others
+    return await asyncio.shield(start(key, function, *args, shared=shared))
+
+
+async def run(key, function, args, shared):
+    try:
+        if shared:
+            async with lock(key):
+                return await function(*args)
+        return await function(*args)
+    finally:
+        if _flights.get(key) is asyncio.current_task():
+            del _flights[key]
+
+
+@asynccontextmanager
+async def lock(key, timeout=None):
+    """Lock of the key shared by every process, nothing if SINGLE_FLIGHT_LOCK isn't set
+
+    Args:
+        timeout     (int)   Seconds before a db lock is taken over, SINGLE_FLIGHT_TIMEOUT by default
+    """
+
+    if settings.SINGLE_FLIGHT_LOCK == "file":
+        async with file_lock(key):
+            yield
+    elif settings.SINGLE_FLIGHT_LOCK == "db":
+        async with db_lock(key, timeout or settings.SINGLE_FLIGHT_TIMEOUT):
+            yield
+    else:
+        yield
+
+
+@asynccontextmanager
+async def file_lock(key):
+    """flock of a file named after the key, released by the OS if the process dies"""
+
+    import fcntl
+
+    os.makedirs(settings.SINGLE_FLIGHT_DIR, exist_ok=True)
+    path = os.path.join(
+        settings.SINGLE_FLIGHT_DIR, hashlib.sha1(key.encode()).hexdigest() + ".lock"
+    )
+
+    with open(path, "a") as file:
+        while True:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(settings.SINGLE_FLIGHT_POLL)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def db_lock(key, timeout):
+    """Row of the key in the FlightLock table, taken over after timeout seconds"""
+
+    while True:
+        try:
+            flight_lock = await FlightLock.objects.acreate(
+                key=key, acquired=timezone.now()
+            )
+            break
+        except IntegrityError:
+            # The holder died without releasing it
+            expired = timezone.now() - timedelta(seconds=timeout)
+            await FlightLock.objects.filter(key=key, acquired__lt=expired).adelete()
+            await asyncio.sleep(settings.SINGLE_FLIGHT_POLL)
+    try:
+        yield
+    finally:
+        # Unless it was taken over in the meantime
+        await FlightLock.objects.filter(
+            key=key, acquired=flight_lock.acquired
+        ).adelete()
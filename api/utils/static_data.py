@@ -0,0 +1,181 @@
+"""
+Process-wide store of the game's static data: runes, rune styles, summoner spells and queues.
+
+The data is indexed by id, loaded once per process and persisted to a local
+file, so it is only downloaded again from CommunityDragon on a new patch.
+"""
+
+import asyncio
+import json
+import os
+
+from api.utils import riot
+from django.conf import settings
+
+# Saved data of another format is downloaded again
+FORMAT = 2
+
+# Queue names shown in the matches list instead of CommunityDragon's
+QUEUES = {
+    400: "Normal Draft",
+    420: "Ranked Solo",
+    430: "Normal Blind",
+}
+
+_data = None
+_lock = None
+
+
+def get_icon_name(icon_path):
+    """Lowercase file name without extension, e.g: .../Summoner_Flash.png -> summoner_flash"""
+    return os.path.splitext(icon_path.rsplit("/", 1)[1])[0].lower()
+
+
+def get_version_tuple(version):
+    """Comparable version, e.g: 13.10.1 -> (13, 10, 1)"""
+    return tuple(int(number) for number in version.split(".") if number.isdigit())
+
+
+async def download(version):
+    """Download the static data from CommunityDragon and index it by id"""
+
+    session = riot.get_session()
+    tables = []
+    for name in (
+        "perks.json",
+        "perkstyles.json",
+        "summoner-spells.json",
+        "queues.json",
+    ):
+        async with session.get(settings.CDRAGON_URL + name) as response:
+            # An error page mustn't be saved as the data of the patch
+            if response.status != 200:
+                raise riot.RiotError(
+                    "CommunityDragon answered " + str(response.status) + " for " + name,
+                    response.status,
+                )
+            tables.append(await response.json(content_type=None))
+    perks, styles, spells, queues = tables
+
+    return {
+        "format": FORMAT,
+        "version": version,
+        # Stat shards aren't inside a style folder, and are never a primary rune
+        "perks": {
+            perk["id"]: perk["iconPath"].split("Styles/", 1)[1]
+            for perk in perks
+            if "Styles/" in perk["iconPath"]
+        },
+        "styles": {
+            style["id"]: get_icon_name(style["iconPath"])
+            for style in styles["styles"]
+        },
+        "spells": {
+            spell["id"]: get_icon_name(spell["iconPath"]) for spell in spells
+        },
+        # CommunityDragon's names, e.g: {"450": {"name": "ARAM", ...}}, under the app's
+        "queues": {
+            **{
+                queue["id"]: queue["name"]
+                for queue in queues.values()
+                if queue.get("name")
+            },
+            **QUEUES,
+        },
+    }
+
+
+def read_file():
+    """Static data saved by a previous process, None if there isn't any"""
+    try:
+        with open(settings.STATIC_DATA_FILE) as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if data.get("format") != FORMAT:
+        return None
+
+    # JSON object keys are always strings
+    for table in ("perks", "styles", "spells", "queues"):
+        data[table] = {int(key): value for key, value in data[table].items()}
+    return data
+
+
+def write_file(data):
+    """Replace the saved static data, other processes never read a partial file"""
+    temporary_file = settings.STATIC_DATA_FILE + ".tmp"
+    with open(temporary_file, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary_file, settings.STATIC_DATA_FILE)
+
+
+def is_outdated(data, patch):
+    """True if there isn't data or it's older than the patch"""
+    return data is None or (
+        patch is not None
+        and get_version_tuple(patch) > get_version_tuple(data["version"])
+    )
+
+
+async def load(patch=None):
+    """Make sure the static data is loaded, downloaded again if it's older than the patch
+
+    Args:
+        patch       (string)    Patch of the matches that will use the data, e.g: 13.1.1
+    """
+
+    global _data
+
+    if not is_outdated(_data, patch):
+        return _data
+
+    # Only one coroutine downloads, the others wait for its data
+    async with get_lock():
+        if _data is None:
+            _data = read_file()
+
+        if is_outdated(_data, patch):
+            _data = await download(patch or "0")
+            write_file(_data)
+
+    return _data
+
+
+def get_lock():
+    """Lock of the download, created inside the running event loop"""
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    return _lock
+
+
+def get_data():
+    """Static data loaded by load(), or saved by a previous process"""
+
+    global _data
+
+    if _data is None:
+        _data = read_file()
+    if _data is None:
+        raise RuntimeError("Static data isn't loaded, await static_data.load() first")
+    return _data
+
+
+def get_perk(perk_id):
+    """Icon path inside the styles folder, e.g: Precision/Conqueror/Conqueror.png"""
+    return get_data()["perks"].get(perk_id, "RunesIcon.png")
+
+
+def get_style(style_id):
+    """Style icon name, e.g: 7201_precision"""
+    return get_data()["styles"].get(style_id, "7204_resolve")
+
+
+def get_spell(spell_id):
+    """Summoner spell icon name, e.g: summoner_flash"""
+    return get_data()["spells"].get(spell_id, "summoner_empty")
+
+
+def get_queue(queue_id):
+    """Queue name, e.g: Ranked Solo"""
+    return get_data()["queues"].get(queue_id, "Special")
@@ -0,0 +1,253 @@
+"""
+Functions that bring the matches of a summoner in database up to date with RIOT's API.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from api.models import Match, Participant, Summoner
+from api.utils import (
+    aggregates,
+    databases,
+    interactions,
+    jobs,
+    rollups,
+    singleflight,
+    static_data,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def sync_matchlist(server, summoner_db, count=100):
+    """Add the matches played since the newest known match of the summoner.
+
+    The first sync adds the last 100 matches, older matches are added by backfill_matchlist.
+
+    Returns:
+        List with the match ids that weren't in database
+    """
+
+    if summoner_db.last_game_creation is None:
+        matchlist = await interactions.get_matchlist(
+            server, summoner_db.puuid, count=count
+        )
+        new_matches = await sync_to_async(databases.add_matches_to_db)(
+            matchlist, summoner_db.puuid
+        )
+        summoner_db.backfill_start = len(matchlist)
+        summoner_db.backfill_done = len(matchlist) < count
+
+    else:
+        # Epoch seconds, the newest known match is listed again but it's already in database
+        start_time = summoner_db.last_game_creation // 1000
+        new_matches = []
+        listed = []
+        start = 0
+        while True:
+            matchlist = await interactions.get_matchlist(
+                server, summoner_db.puuid, start, count, start_time
+            )
+            listed += matchlist
+            new_matches += await sync_to_async(databases.add_matches_to_db)(
+                matchlist, summoner_db.puuid
+            )
+            if len(matchlist) < count:
+                break
+            start += count
+
+        # New matches push the older ones further down the history. They may already
+        # be in database, hydrated from the match of another summoner
+        known = await Match.objects.filter(
+            match_id__in=listed, game_creation__lte=summoner_db.last_game_creation
+        ).acount()
+        summoner_db.backfill_start += len(listed) - known
+
+    await summoner_db.asave(update_fields=["backfill_start", "backfill_done"])
+    return new_matches
+
+
+async def backfill_matchlist(server, summoner_db, pages=1, count=100):
+    """Add older matches of the summoner, a page of count match ids at a time
+
+    Returns:
+        Number of match ids added
+    """
+
+    added = 0
+    for _ in range(pages):
+        if summoner_db.backfill_done:
+            break
+
+        matchlist = await interactions.get_matchlist(
+            server, summoner_db.puuid, summoner_db.backfill_start, count
+        )
+        new_matches = await sync_to_async(databases.add_matches_to_db)(
+            matchlist, summoner_db.puuid
+        )
+        added += len(new_matches)
+        summoner_db.backfill_start += len(matchlist)
+        summoner_db.backfill_done = len(matchlist) < count
+        await summoner_db.asave(update_fields=["backfill_start", "backfill_done"])
+
+    return added
+
+
+async def hydrate_matches(summoner_db, limit=10, progress=None):
+    """Fetch the newest matches without player summary.
+
+    The summaries of the ten players of each match are computed as soon as it
+    arrives, and the matches and summaries are saved every MATCH_FLUSH_SIZE
+    matches. The summoner stats are computed again by aggregates.rebuild_summoner
+    once they are hydrated.
+
+    Args:
+        limit       (int)       Number of matches
+        progress    (function)  Awaited with the number of matches saved after each batch
+
+    Returns:
+        Number of matches hydrated, or skipped because they can't be fetched or summarized
+    """
+
+    match_not_in_database = await sync_to_async(databases.find_matches_not_in_db)(
+        summoner_db.puuid, limit
+    )
+
+    hydrated = 0
+    match_json_list = []
+    player_summary_list = []
+    skipped = []
+    batch = 0
+
+    async for match, match_json, saved in interactions.stream_matches(
+        match_not_in_database
+    ):
+        if match_json is None:
+            skipped.append(match)
+            continue
+
+        # Refresh runes and spells if the match is from a newer patch
+        await static_data.load(match_json.get("patch"))
+        try:
+            player_summaries = interactions.get_player_summaries(match_json)
+        except (KeyError, IndexError, TypeError, ValueError):
+            logger.exception("Match %s can't be summarized", match)
+            skipped.append(match)
+            continue
+
+        player_summary_list += player_summaries
+        if not saved:
+            match_json_list.append(match_json)
+        batch += 1
+
+        if batch >= settings.MATCH_FLUSH_SIZE:
+            await save_batch(match_json_list, player_summary_list)
+            hydrated += batch
+            match_json_list = []
+            player_summary_list = []
+            batch = 0
+            if progress is not None:
+                await progress(hydrated)
+
+    if batch:
+        await save_batch(match_json_list, player_summary_list)
+        hydrated += batch
+
+    # A match that fails once fails on every sync, it mustn't keep the others waiting
+    if skipped:
+        await sync_to_async(databases.skip_matches)(summoner_db.puuid, skipped)
+
+    return hydrated + len(skipped)
+
+
+@sync_to_async
+def save_batch(match_json_list, player_summary_list):
+    """Save the fetched matches, then the summaries that reference them and the champion rollups"""
+    if match_json_list:
+        databases.save_matches_to_db(match_json_list)
+    databases.save_player_summaries_to_db(player_summary_list)
+    rollups.add_matches(
+        {player_summary["matchId"] for player_summary in player_summary_list}
+    )
+
+
+async def update_cursor(summoner_db):
+    """Save the creation of the newest hydrated match, where the next sync starts"""
+    newest = await Participant.objects.filter(
+        puuid=summoner_db.puuid, hydrated=True
+    ).aaggregate(newest=Max("game_creation"))
+    if newest["newest"] is not None:
+        summoner_db.last_game_creation = newest["newest"]
+        await summoner_db.asave(update_fields=["last_game_creation"])
+
+
+async def sync_summoner(job):
+    """Bring the profile, leagues, matches and stats of the job's summoner up to date
+
+    Workers sync a summoner one at a time, a job queued during another worker's
+    sync of the summoner is done once that sync finishes.
+    """
+
+    key = "sync:" + job.server + ":" + job.summoner_name
+    async with singleflight.lock(key, settings.SYNC_JOB_TIMEOUT):
+        summoner_db = await Summoner.objects.filter(
+            server=job.server, summoner=job.summoner_name, synced_at__gte=job.created
+        ).afirst()
+        if summoner_db is not None:
+            await jobs.finish_job(job)
+            return
+
+        await run_sync(job)
+
+
+async def run_sync(job):
+    """Body of sync_summoner, the job's summoner is locked"""
+
+    summoner = await interactions.get_summoner(job.server, job.summoner_name)
+    if not summoner["success"]:
+        await jobs.finish_job(job, "Summoner not found")
+        return
+
+    summoner_league = await interactions.get_summoner_league(job.server, summoner)
+
+    # if summoner not in database, create object for the stats database
+    summoners = Summoner.objects.filter(server=job.server, summoner=job.summoner_name)
+    if not await summoners.aexists():
+        await sync_to_async(databases.create_user_db)(
+            job.server, job.summoner_name, summoner["puuid"]
+        )
+
+    summoner_db = await summoners.aget()
+    summoner_db.puuid = summoner["puuid"]
+    summoner_db.summoner_json = summoner
+    summoner_db.league_json = summoner_league
+    await summoner_db.asave(update_fields=["puuid", "summoner_json", "league_json"])
+
+    await sync_matchlist(job.server, summoner_db)
+
+    matches_total = await Participant.objects.filter(
+        puuid=summoner_db.puuid, hydrated=False
+    ).acount()
+    matches_done = 0
+    await jobs.update_progress(job, matches_done, matches_total)
+
+    async def progress(hydrated):
+        await jobs.update_progress(job, matches_done + hydrated)
+
+    hydrated = await hydrate_matches(summoner_db, settings.HYDRATE_BATCH, progress)
+    while hydrated:
+        matches_done += hydrated
+        await jobs.update_progress(job, matches_done)
+        hydrated = await hydrate_matches(summoner_db, settings.HYDRATE_BATCH, progress)
+
+    # Matches hydrated from another summoner's sync count too, only a change is saved
+    await update_cursor(summoner_db)
+    await sync_to_async(aggregates.rebuild_summoner)(summoner_db)
+
+    summoner_db.synced_at = timezone.now()
+    await summoner_db.asave(update_fields=["synced_at"])
+    await jobs.finish_job(job)
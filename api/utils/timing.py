@@ -0,0 +1,96 @@
+"""
+Time spent by the current request in each phase: Riot calls, rate limit waits,
+database queries and template rendering.
+
+The phases are added up in a dictionary of the request's context, so the
+hooks are a context variable lookup outside requests, e.g: in the worker. The
+header and logs are written by api.middleware.ServerTimingMiddleware.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django import shortcuts
+
+# phase -> [seconds, count] of the request being served
+_timings = ContextVar("timings", default=None)
+
+
+def start():
+    """Start timing the phases of the current context
+
+    Returns:
+        Tuple with the timings dictionary and the token of stop()
+    """
+    timings = {}
+    return timings, _timings.set(timings)
+
+
+def stop(token):
+    """Stop timing the phases of the current context"""
+    _timings.reset(token)
+
+
+def add(name, seconds):
+    """Add the seconds of a phase to the current request, if there is one"""
+    timings = _timings.get()
+    if timings is not None:
+        total = timings.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+
+@contextmanager
+def phase(name):
+    """Time the block as a phase of the current request
+
+    Phases run concurrently, e.g: the ten league calls of a match, add up more
+    than the time they took together.
+    """
+
+    if _timings.get() is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Database execute wrapper timing the queries"""
+    with phase("db"):
+        return execute(sql, params, many, context)
+
+
+def add_execute_wrapper(sender, connection, **kwargs):
+    """connection_created receiver connected by api.apps.ApiConfig"""
+    connection.execute_wrappers.append(execute_wrapper)
+
+
+async def render(request, template_name, context=None):
+    """django.shortcuts.render in the ORM thread, timed as the render phase
+
+    Queries made while rendering, e.g: cached template fragments, are in the db phase too.
+    """
+    with phase("render"):
+        return await sync_to_async(shortcuts.render)(request, template_name, context)
+
+
+def get_header(timings, total):
+    """Server-Timing header, e.g: riot;dur=812.4;desc="3 calls", total;dur=901.2"""
+    metrics = [
+        name
+        + ";dur="
+        + str(round(seconds * 1000, 1))
+        + ';desc="'
+        + str(count)
+        + (' call"' if count == 1 else ' calls"')
+        for name, (seconds, count) in timings.items()
+    ]
+    metrics.append("total;dur=" + str(round(total * 1000, 1)))
+    return ", ".join(metrics)
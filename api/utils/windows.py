@@ -0,0 +1,179 @@
+"""
+Summoner stats of a queue and a time window, read from buckets of partial sums.
+
+The participants of every match are added to the StatBucket of their player,
+day, queue, patch, champion and role once, when the match is added to the
+champion rollups. The stats of a window are then the sums of a few buckets
+instead of a pass over the stored matches.
+"""
+
+import time
+
+from django.db.models import F, Max, Sum
+
+from api.models import Participant, StatBucket
+from api.utils import aggregates, databases
+
+# Profile filters, queue ids of each queue
+QUEUES = {
+    "solo": [420],
+    "flex": [440],
+    "normal": [400, 430, 490],
+}
+# Windows in days, "20" is the last 20 matches and "patch" the newest patch played
+DAYS = {"7d": 7, "30d": 30}
+WINDOWS = ["20", "patch"] + list(DAYS)
+
+DAY = 24 * 60 * 60 * 1000  # Milliseconds
+KEY_FIELDS = ["puuid", "queue_id", "day", "patch", "champion_name", "role"]
+
+# Participant columns, loaded in this order
+COLUMNS = [
+    "puuid",
+    "champion_name",
+    "team_position",
+    "game_creation",
+    "win",
+    "match__queue_id",
+    "match__patch",
+    "match__game_duration",
+] + aggregates.STATS + ["gold", "damage"]
+
+
+def get_participants():
+    """Participants counted in the stats, the same as aggregates.get_columns"""
+    return (
+        Participant.objects.filter(hydrated=True, match__game_mode="CLASSIC")
+        .exclude(team_position="")
+        .values(*COLUMNS)
+    )
+
+
+def add_totals(totals, participant):
+    """Add a participant row to the aggregates.TOTALS of a bucket"""
+    totals["matches"] += 1
+    totals["wins"] += int(participant["win"])
+    # Same minutes as the match cards, e.g: 1774 seconds -> 30
+    totals["minutes"] += round(participant["match__game_duration"] / 60)
+    for stat in aggregates.STATS + ["gold", "damage"]:
+        totals[stat] += participant[stat]
+    totals["last_played"] = max(totals["last_played"], participant["game_creation"])
+
+
+def group_participants(participants, key):
+    """Totals of the participant rows with the same key
+
+    Returns:
+        Dictionary with the totals of every key
+    """
+
+    groups = {}
+    for participant in participants:
+        totals = groups.setdefault(
+            key(participant), dict.fromkeys(aggregates.TOTALS + ["last_played"], 0)
+        )
+        add_totals(totals, participant)
+    return groups
+
+
+def add_matches(match_ids):
+    """Add the counted participants of the matches to their buckets
+
+    Called by rollups.add_matches, which adds each match once.
+    """
+
+    buckets = group_participants(
+        get_participants().filter(match_id__in=match_ids),
+        lambda participant: (
+            participant["puuid"],
+            participant["match__queue_id"],
+            participant["game_creation"] // DAY,
+            participant["match__patch"],
+            participant["champion_name"],
+            participant["team_position"].lower(),
+        ),
+    )
+
+    increment(StatBucket, KEY_FIELDS, buckets)
+
+
+def increment(model, key_fields, groups):
+    """Add the totals of each key to its row, created if it's missing"""
+    databases.increment(
+        model,
+        key_fields,
+        [dict(totals, **dict(zip(key_fields, key))) for key, totals in groups.items()],
+        aggregates.TOTALS,
+        max_fields=["last_played"],
+    )
+
+
+def summarize(groups):
+    """Stats of the totals of each champion and role, with the top champions only"""
+    stats = aggregates.summarize(groups)
+    stats["champions"] = aggregates.get_top_champions(groups, stats["matches"])
+    return stats
+
+
+def get_last_matches(puuid, queue_ids=None, count=20):
+    """Stats of the newest matches of the summoner, from its participants"""
+    participants = get_participants().filter(puuid=puuid)
+    if queue_ids:
+        participants = participants.filter(match__queue_id__in=queue_ids)
+
+    groups = group_participants(
+        participants.order_by("-game_creation")[:count],
+        lambda participant: (
+            participant["champion_name"],
+            participant["team_position"].lower(),
+        ),
+    )
+    return summarize(
+        [
+            dict(totals, champion=champion, role=role)
+            for (champion, role), totals in groups.items()
+        ]
+    )
+
+
+def get_stats(puuid, queue=None, window=None):
+    """Overall, role and champion stats of the summoner in a queue and window
+
+    Args:
+        puuid       (string)
+        queue       (string)    Key of QUEUES, every queue by default
+        window      (string)    One of WINDOWS, every match by default
+
+    Returns:
+        Dictionary with the values of the aggregates.STAT_FIELDS and the top champions
+    """
+
+    queue_ids = QUEUES.get(queue)
+    if window == "20":
+        # Matches aren't bucketed by number, but the last 20 are a 20 rows read
+        return get_last_matches(puuid, queue_ids)
+
+    buckets = StatBucket.objects.filter(puuid=puuid)
+    if queue_ids:
+        buckets = buckets.filter(queue_id__in=queue_ids)
+
+    if window in DAYS:
+        today = int(time.time() * 1000) // DAY
+        buckets = buckets.filter(day__gt=today - DAYS[window])
+    elif window == "patch":
+        patch = (
+            buckets.order_by("-day", "-last_played")
+            .values_list("patch", flat=True)
+            .first()
+        )
+        buckets = buckets.filter(patch=patch)
+
+    groups = (
+        buckets.values("role", champion=F("champion_name"))
+        .annotate(
+            last_played=Max("last_played"),
+            **{total: Sum(total) for total in aggregates.TOTALS}
+        )
+        .order_by()
+    )
+    return summarize(list(groups))
@@ -1,14 +1,29 @@
 """
 Python functions that takes a Web request and returns a Web response.
 """
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
+import time
+from functools import partial
 
-from api.utils import databases, interactions, sessions
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, redirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+
+from api.utils import (
+    breaker,
+    cache,
+    champions,
+    databases,
+    helpers,
+    jobs,
+    metrics,
+    riot,
+    rollups,
+    timing,
+    windows,
+)
 from api.models import Summoner, Match
 
-from asyncio import run
-
 
 def index(request):
     """Home page"""
@@ -22,76 +37,183 @@ def index(request):
     return render(request, "api/index.html")
 
 
-def user_info(request, server, summoner_name, template="api/profile.html"):
-    """Summoners' profile page"""
+def prometheus_metrics(request):
+    """Riot calls, cache lookups and ingested matches, for Prometheus"""
+    return HttpResponse(
+        metrics.export(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
-    # If user submits the form, it will redirect to the user profile page
-    if ("summoners_name" and "server") in request.POST:
-        return redirect(
-            "/" + request.POST["server"] + "/" + request.POST["summoners_name"] + "/"
-        )
 
-    summoner, summoner_league = sessions.load_summoner_league(
-        request, server, summoner_name
+async def champion_stats(request):
+    """Tier list of the champions in every stored match of a patch and queue
+
+    Query parameters: queue (420 by default), patch (the newest by default) and role
+    """
+
+    try:
+        queue_id = int(request.GET.get("queue", 420))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid queue")
+
+    patch = request.GET.get("patch")
+    if not patch:
+        patches = await sync_to_async(rollups.get_patches)(queue_id)
+        if not patches:
+            raise Http404("No matches in this queue")
+        patch = patches[0]
+
+    tier_list = await sync_to_async(rollups.get_tier_list)(
+        patch, queue_id, request.GET.get("role")
     )
+    return JsonResponse(tier_list)
 
-    if summoner["success"]:
-        # if summoner not in database, create object for the stats database
-        if not Summoner.objects.filter(summoner=summoner_name).exists():
-            databases.create_user_db(summoner_name)
 
-        matchlist = interactions.get_matchlist(server, summoner["puuid"])
-        databases.add_matches_to_db(matchlist, summoner_name)
-        match_not_in_database = databases.find_matches_not_in_db(
-            matchlist, summoner_name
-        )
+def is_riot_unavailable(server):
+    """Whether the syncs of the server's summoners fail at once, see breaker.py"""
+    return breaker.is_open(server, helpers.get_region_by_platform(server))
+
+
+async def user_info(request, server, summoner_name, template="api/profile.html"):
+    """Summoners' profile page, rendered from database while a worker syncs it with Riot"""
 
-        summoner_db = Summoner.objects.get(summoner=summoner_name)
+    # If user submits the form, it will redirect to the user profile page
+    if ("summoners_name" and "server") in request.POST:
+        return redirect(
+            "/" + request.POST["server"] + "/" + request.POST["summoners_name"] + "/"
+        )
 
-        if match_not_in_database:
-            match_json_list = run(
-                interactions.get_match_json_list(match_not_in_database)
-            )
-            databases.save_matches_to_db(match_json_list, summoner_name)
+    # Summoners of an unknown server, e.g: a typo in the url, are never looked up
+    if server not in helpers.REGIONS:
+        return await timing.render(request, template, {"summoner": {"success": False}})
 
-            perks_json = sessions.load_perks_json(request)
-            player_summary_list = run(
-                interactions.get_player_summary_list(match_json_list, summoner["puuid"], perks_json)
-            )
+    summoner_db = await Summoner.objects.filter(
+        server=server, summoner=summoner_name
+    ).afirst()
+    if summoner_db is not None and not summoner_db.summoner_json:
+        # Summoners stored before profiles were saved are synced like new ones
+        summoner_db = None
 
-            databases.save_player_summaries_to_db(player_summary_list, summoner_name)
-            summoner_db = databases.update_summoner_db(summoner_db, player_summary_list)
-            summoner_db.save()
+    job = await jobs.enqueue_sync(server, summoner_name, summoner_db)
 
+    if summoner_db is not None:
+        match_list, next_cursor = await sync_to_async(databases.get_feed_page)(
+            summoner_db.puuid, size=settings.MATCHES_PER_PAGE
+        )
         context = {
-            "match_list": Match.objects.all().filter(summoner=summoner_name),
-            "summoner": summoner,
-            "summoner_league": summoner_league,
+            "match_list": match_list,
+            "next_cursor": next_cursor,
+            "summoner": summoner_db.summoner_json,
+            "summoner_league": summoner_db.league_json,
             "summoner_db": summoner_db,
+            "summoner_stats": summoner_db,
+            # Called by the template, only when the cached stats expired
+            "summoner_champions": partial(
+                champions.get_top, summoner_db.puuid, summoner_db.matches
+            ),
+            "job": job,
         }
 
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            template = "api/include/matches.html"
+    # First visit, the page shows the sync progress until the worker finishes
+    elif job is not None:
+        context = {
+            "match_list": [],
+            "summoner": {"name": summoner_name, "success": True},
+            "summoner_league": {
+                "RANKED_SOLO_5x5": {"tier": "Unranked"},
+                "RANKED_FLEX_SR": {"tier": "Unranked"},
+            },
+            "job": job,
+        }
 
     # If user not found
     else:
-        context = {"summoner": summoner}
+        context = {"summoner": {"success": False}}
 
-    return render(request, template, context)
+    context["riot_unavailable"] = is_riot_unavailable(server)
+    return await timing.render(request, template, context)
 
 
-def summoner_stats_refresh(request, server, summoner_name):
-    summoner_db = Summoner.objects.get(summoner=summoner_name)
-    return render(request, "api/include/refresh.html", {"summoner_db": summoner_db})
+async def summoner_matches(request, server, summoner_name):
+    """Next page of match cards, loaded on scroll from the database only"""
 
+    puuid = await (
+        Summoner.objects.filter(server=server, summoner=summoner_name)
+        .values_list("puuid", flat=True)
+        .afirst()
+    )
+    if not puuid:
+        raise Http404("Summoner not found")
+
+    try:
+        match_list, next_cursor = await sync_to_async(databases.get_feed_page)(
+            puuid, request.GET.get("before"), settings.MATCHES_PER_PAGE
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
 
-def get_match_data(request, server, summoner_name, match_id):
+    return await timing.render(
+        request,
+        "api/include/matches.html",
+        {"match_list": match_list, "next_cursor": next_cursor},
+    )
+
+
+async def summoner_stats_refresh(request, server, summoner_name):
+    """Stats of the summoner and progress of its sync, polled while it's syncing
+
+    Query parameters: queue (a key of windows.QUEUES) and window (one of
+    windows.WINDOWS), the stats of every match by default
+    """
+
+    queue = request.GET.get("queue", "")
+    window = request.GET.get("window", "")
+    if queue and queue not in windows.QUEUES or window and window not in windows.WINDOWS:
+        return HttpResponseBadRequest("Invalid filter")
+
+    summoner_db = await Summoner.objects.filter(
+        server=server, summoner=summoner_name
+    ).afirst()
+    job = await jobs.get_latest_job(server, summoner_name)
+
+    summoner_stats = summoner_db
+    summoner_champions = None
+    if summoner_db is not None and (queue or window):
+        summoner_stats = await sync_to_async(windows.get_stats)(
+            summoner_db.puuid, queue, window
+        )
+        summoner_champions = summoner_stats["champions"]
+    elif summoner_db is not None:
+        # Called by the template, only when the cached stats expired
+        summoner_champions = partial(
+            champions.get_top, summoner_db.puuid, summoner_db.matches
+        )
+
+    return await timing.render(
+        request,
+        "api/include/refresh.html",
+        {
+            "summoner_db": summoner_db,
+            "summoner_stats": summoner_stats,
+            "summoner_champions": summoner_champions,
+            "stats_queue": queue,
+            "stats_window": window,
+            # Windows in days move every day, not only when stats_version changes
+            "stats_day": int(time.time()) // 86400 if window in windows.DAYS else "",
+            "job": job,
+            "riot_unavailable": is_riot_unavailable(server),
+        },
+    )
+
+
+async def get_match_data(request, server, summoner_name, match_id):
     """
     Loads match information when load button is pressed in user_info
     """
-    match_object = Match.objects.get(match_id=match_id, summoner=summoner_name)
-    match_info_json = sessions.load_match_summary(
-        request, server, match_id, match_object.match_json["info"]
-    )
+    match_object = await Match.objects.aget(match_id=match_id)
+    # Ranks Riot can't answer in time are left out, see get_players_ranks
+    with riot.deadline(settings.RIOT_VIEW_DEADLINE):
+        match_info_json = await cache.load_match_summary(
+            server, match_id, match_object.match_json["info"]
+        )
 
     return JsonResponse(match_info_json)